@@ -129,6 +129,7 @@ class EmbedCommand(BaseCommand):
         try:
             with self.console.status("[bold green]Embedding and storing documents...", spinner="dots") as status:
                 await embedding_manager.add_texts(texts=texts, metadatas=metadatas)
+                await embedding_manager.flush()
                 status.update("[bold green]Embedding complete!")
 
             self.console.print(Panel(
@@ -1,12 +1,16 @@
+from functools import cache
+
 from .prompt import PromptProviderType, PromptType, PromptProvider
 from .semantic import SemanticPromptProvider
 
 
+@cache
 def get_provider(prompt_type: PromptProviderType) -> PromptProvider:
     if prompt_type == PromptProviderType.SEMANTIC:
         return SemanticPromptProvider()
 
 
+@cache
 def get_prompt_function(prompt_type: PromptType, prompt_provider: PromptProviderType):
     provider = get_provider(prompt_provider)
     if prompt_type == PromptType.FILE_WISE:
@@ -1,9 +1,13 @@
-from .query import QueryProcessor, LLMType
-from .stream import StreamQueryProcessor
+from .query import QueryProcessor, LLMType, AnalysisBatch
+from .stream import StreamQueryProcessor, StreamingResult
+from .usage import UsageCallbackHandler
 
 
 __all__ = [
     "QueryProcessor",
     "StreamQueryProcessor",
     "LLMType",
+    "AnalysisBatch",
+    "StreamingResult",
+    "UsageCallbackHandler",
 ]
@@ -1,3 +1,6 @@
+import re
+
+
 SINGLE_LINE_COMMENT_PATTERNS = {
     'slash': r'//[^\n]*',           # For languages using // comments
     'hash': r'#[^\n]*',             # For Python-style # comments
@@ -32,6 +35,32 @@ LANGUAGE_COMMENT_STYLES = {
     'less': {'inline': 'css', 'block': 'c_style'}
 }
 
+EXT_TO_LANG = {
+    '.py': 'python',
+    '.js': 'javascript',
+    '.java': 'java',
+    '.go': 'go',
+    '.rs': 'rust',
+    '.ts': 'javascript',
+    '.jsx': 'javascript',
+    '.tsx': 'javascript',
+    '.c': 'c',
+    '.cpp': 'cpp',
+    '.h': 'c',
+    '.hpp': 'cpp',
+    '.cs': 'csharp',
+    '.php': 'php',
+    '.rb': 'ruby',
+    '.swift': 'swift',
+    '.kt': 'kotlin',
+    '.ktm': 'kotlin',
+    '.html': 'html',
+    '.css': 'css',
+    '.scss': 'css',
+    '.sass': 'css',
+    '.less': 'css'
+}
+
 COMMON_PATTERNS = {
     'empty_lines': r'\n\s*\n',
     'trailing_whitespace': r'[ \t]+$',
@@ -45,3 +74,20 @@ COMMON_PATTERNS = {
         for lang, style in LANGUAGE_COMMENT_STYLES.items()
     }
 }
+
+
+# Compiled once at import so preprocessing never pays for pattern parsing.
+# Block and inline comment rules are fused into a single alternation per
+# language, which strips both in one scan of the code.
+COMPILED_COMMENT_PATTERNS = {
+    lang: re.compile(
+        f"{COMMON_PATTERNS['block_comments'][lang]}|{COMMON_PATTERNS['inline_comments'][lang]}"
+    )
+    for lang in LANGUAGE_COMMENT_STYLES
+}
+
+INDENT_PATTERN = re.compile(r'^[ \t]+', re.MULTILINE)
+EMPTY_LINES_PATTERN = re.compile(COMMON_PATTERNS['empty_lines'])
+TRAILING_WHITESPACE_PATTERN = re.compile(
+    COMMON_PATTERNS['trailing_whitespace'], re.MULTILINE)
+MULTIPLE_SPACES_PATTERN = re.compile(COMMON_PATTERNS['multiple_spaces'])
@@ -1,26 +1,43 @@
-import re
 import asyncio
+import logging
+from bisect import bisect_right
+from itertools import accumulate
+from functools import lru_cache
 from enum import Enum
 
 from dataclasses import dataclass
-from typing import Any, Optional, AsyncGenerator
+from typing import Any, Optional, AsyncGenerator, Sequence
 from pathlib import Path
 
+import tiktoken
 from langchain_core.language_models import BaseLanguageModel
 from langchain_core.messages import BaseMessage
 
 
-from .pattern import COMMON_PATTERNS
+from .usage import UsageCallbackHandler
+from .pattern import (
+    EXT_TO_LANG,
+    COMPILED_COMMENT_PATTERNS,
+    INDENT_PATTERN,
+    EMPTY_LINES_PATTERN,
+    TRAILING_WHITESPACE_PATTERN,
+    MULTIPLE_SPACES_PATTERN,
+)
 from prompt import PromptProviderType, PromptType, get_prompt_function
 from vector import EmbeddingManager, SearchResult
 
+logger = logging.getLogger(__name__)
 
-@dataclass
+# Rough characters per token, used when the LLM's tokenizer is not available
+CHARS_PER_TOKEN = 4
+
+
+@dataclass(slots=True, frozen=True)
 class AnalysisBatch:
     """Represents a batch of code for analysis."""
     files: list[str]
     contents: list[str]
-    total_chars: int
+    total_tokens: int
     metadata: dict[str, Any]
 
 
@@ -45,7 +62,8 @@ class QueryProcessor:
                  llm: BaseLanguageModel,
                  max_results: int = 10,
                  min_relevance_score: float = 0.5,
-                 max_batch_tokens: float = 6000) -> None:
+                 max_batch_tokens: float = 6000,
+                 max_total_tokens: Optional[int] = None) -> None:
         """
         Initialize the QueryProcessor.
 
@@ -57,6 +75,9 @@ class QueryProcessor:
                 Defaults to 0.5.
             max_batch_tokens (float, optional): Maximum tokens per batch sent to LLM.
                 Defaults to 6000.
+            max_total_tokens (Optional[int], optional): Token budget for a whole query.
+                No further batches are sent to the LLM once it is exceeded.
+                Defaults to None (no budget).
 
         The QueryProcessor coordinates between the embedding system for semantic search
         and the language model for code analysis. It batches results based on token limits
@@ -67,6 +88,14 @@ class QueryProcessor:
         self.max_results = max_results
         self.min_relevance_score = min_relevance_score
         self.max_batch_tokens = max_batch_tokens
+        self.max_total_tokens = max_total_tokens
+
+        # The tokenizer is loaded on first use, since tiktoken may download it
+        self._model_name: Optional[str] = getattr(llm, "model_name", None)
+        self.__encoding: Optional[tiktoken.Encoding] = None
+        self.__encoding_loaded = False
+        # Result texts repeat across batches and queries, so count each one once
+        self._count_tokens = lru_cache(maxsize=4096)(self.__count_tokens)
 
     async def process_query(self, query: str,
                             prompt_type: Optional[PromptType] = PromptType.AGGREGATE,
@@ -80,6 +109,7 @@ class QueryProcessor:
         2. Creates batches of code for analysis based on token limits
         3. Generates prompts using the specified prompt type and provider
         4. Invokes the LLM for analysis and yields results incrementally
+        5. Stops early once the tokens spent exceed ``max_total_tokens``
 
         Args:
             query (str): The search query to find relevant code sections
@@ -100,22 +130,28 @@ class QueryProcessor:
         """
         try:
             search_results = await self._get_similar_results(query, filters)
+            usage = UsageCallbackHandler()
+            offsets = self._batch_offsets(search_results)
 
             batch_index = 0
             while batch_index < len(search_results):
-                batch = self._create_batch(batch_index, search_results)
+                if usage.exceeds(self.max_total_tokens):
+                    logger.warning("Token budget exceeded: %d tokens used", usage.total_tokens)
+                    break
+
+                batch = self._create_batch(batch_index, search_results, offsets)
                 if not batch:
                     break
 
-                prompt = self.create_prompt(query, "".join(
-                    batch.contents), prompt_type, prompt_provider)
+                prompt = self.create_prompt(
+                    query, batch.contents, prompt_type, prompt_provider)
 
-                llm_response = await self.llm.ainvoke(prompt)
+                llm_response = await self.llm.ainvoke(prompt, config={"callbacks": [usage]})
                 yield llm_response
                 batch_index = batch.metadata['end_index']
 
         except Exception as e:
-            print(f"Error processing query: {e}")
+            logger.exception("Error processing query")
             raise e
 
     async def __search_vector_db(self, query: str, filters: Optional[list[str]] = None):
@@ -151,111 +187,134 @@ class QueryProcessor:
         4. Returns the processed and filtered results
         """
         search_results = await self.__search_vector_db(query, filters)
-        print(f"Search results found: {len(search_results)}")
-        print([(result.source_file, result.score)
-              for result in search_results])
+        logger.debug("Search results found: %d", len(search_results))
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("%s", [(result.source_file, result.score)
+                                for result in search_results])
 
-        async def process_result(result):
-            code = result.text
-            result.text = self.preprocess_code(code, result.source_file)
-            return result if result.score >= self.min_relevance_score else None
+        return await asyncio.to_thread(self._batch_preprocess, search_results)
 
-        processed_results = await asyncio.gather(
-            *[process_result(result) for result in search_results]
-        )
-        filtered_results = [r for r in processed_results if r is not None]
+    def _batch_preprocess(self, search_results: list[SearchResult],
+                          min_score: Optional[float] = None) -> list[SearchResult]:
+        """
+        Preprocesses the code of every result that meets the minimum score.
+
+        ``min_score`` defaults to ``min_relevance_score``. Runs off the event loop,
+        so the regex work over many chunks does not block other coroutines while
+        it executes.
+        """
+        if min_score is None:
+            min_score = self.min_relevance_score
+
+        filtered_results = []
+        for result in search_results:
+            if result.score < min_score:
+                continue
+            result.text = self.preprocess_code(result.text, result.source_file)
+            filtered_results.append(result)
 
         return filtered_results
 
-    def _create_batch(self, start_idx: int, processed_results: list[SearchResult]) -> AnalysisBatch | None:
+    def _create_batch(self, start_idx: int, processed_results: list[SearchResult],
+                      offsets: Optional[list[int]] = None) -> AnalysisBatch | None:
         """
             Creates a batch of code for analysis.
 
+            The batch end is found with a binary search over the cumulative token
+            counts, so each batch boundary costs O(log n) instead of a per-item scan.
+            A single result larger than ``max_batch_tokens`` forms a batch on its own.
+
             Parameters:
                 start_idx: The index of the first result to include in the batch
                 processed_results: List of processed search results
+                offsets: Cumulative token counts from ``_batch_offsets``. Computed
+                    on demand if not given; pass it when creating many batches.
 
             Returns:
                 AnalysisBatch: A batch of code for analysis or None if no results are left
         """
         if start_idx >= len(processed_results):
-            print("No results left", start_idx, len(processed_results))
+            logger.debug("No results left: %d/%d", start_idx, len(processed_results))
             return None
 
-        batch_files: list[str] = []
-        batch_contents: list[str] = []
-        total_chars: int = 0
-        curr_idx = start_idx
-
-        def process_result(rs: SearchResult, curr_chars: int, force_add: bool = False) -> int:
-            """
-                Processes a result and adds it to the batch.
-                Returns the number of characters added or -1 if the result is not added.
-            """
-            file_content = f"\nFile: {
-                rs.source_file}\nContent:\n{rs.text}\n"
-
-            if not force_add and curr_chars + len(file_content) > self.max_batch_tokens:
-                return -1
-
-            batch_files.append(rs.source_file)
-            batch_contents.append(file_content)
-            return len(file_content)
-
-        while curr_idx < len(processed_results) and total_chars < self.max_batch_tokens:
-            result = processed_results[curr_idx]
-            chars_count = process_result(result, total_chars)
-            if chars_count == -1:
-                break
-            total_chars += chars_count
-            curr_idx += 1
-
-        if not batch_files:
-            result = processed_results[curr_idx]
-            total_chars = process_result(result, total_chars, force_add=True)
-            curr_idx += 1
+        if offsets is None:
+            offsets = self._batch_offsets(processed_results)
 
+        base = offsets[start_idx - 1] if start_idx else 0
+        end_idx = bisect_right(offsets, base + self.max_batch_tokens, lo=start_idx)
+        end_idx = max(end_idx, start_idx + 1)
+
+        batch = processed_results[start_idx:end_idx]
         return AnalysisBatch(
-            files=batch_files,
-            contents=batch_contents,
-            total_chars=total_chars,
+            files=[result.source_file for result in batch],
+            contents=[self._format_result(result) for result in batch],
+            total_tokens=offsets[end_idx - 1] - base,
             metadata={
-                'end_index': curr_idx,
+                'end_index': end_idx,
                 'start_index': start_idx,
                 'total_results': len(processed_results)
             }
         )
 
+    def _batch_offsets(self, processed_results: list[SearchResult]) -> list[int]:
+        """
+        Cumulative token counts of the formatted results, used to find batch boundaries.
+        """
+        return list(accumulate(self._count_tokens(self._format_result(result))
+                               for result in processed_results))
+
+    def __count_tokens(self, text: str) -> int:
+        """
+        Count the tokens the LLM's tokenizer produces for the text.
+
+        Estimated as one token per ``CHARS_PER_TOKEN`` characters when there is
+        no tokenizer for the LLM.
+        """
+        encoding = self._encoding
+        if encoding is None:
+            return -(-len(text) // CHARS_PER_TOKEN)
+        return len(encoding.encode_ordinary(text))
+
+    @property
+    def _encoding(self) -> Optional[tiktoken.Encoding]:
+        """The LLM's tokenizer, loaded on first access; None if there is none."""
+        if not self.__encoding_loaded:
+            self.__encoding = self._get_encoding(self._model_name)
+            self.__encoding_loaded = True
+        return self.__encoding
+
+    @staticmethod
+    def _get_encoding(model_name: Optional[str]) -> Optional[tiktoken.Encoding]:
+        """
+        Get the tiktoken tokenizer of an OpenAI model.
+
+        Returns None for models tiktoken does not know, which it cannot measure,
+        and when the tokenizer cannot be loaded, e.g. offline on first use.
+        """
+        if not model_name:
+            return None
+        try:
+            encoding_name = tiktoken.model.encoding_name_for_model(model_name)
+        except KeyError:
+            return None
+
+        try:
+            return tiktoken.get_encoding(encoding_name)
+        except Exception as e:
+            logger.warning("Could not load the %s tokenizer, estimating token counts: %s",
+                           encoding_name, e)
+            return None
+
+    @staticmethod
+    def _format_result(result: SearchResult) -> str:
+        """Format a search result as it appears in the LLM prompt."""
+        return f"\nFile: {result.source_file}\nContent:\n{result.text}\n"
+
     @classmethod
     def detect_language(cls, file_path: str) -> str:
         """Detect the programming language based on file extension and content."""
         ext = Path(file_path).suffix.lower()
-        ext_to_lang = {
-            '.py': 'python',
-            '.js': 'javascript',
-            '.java': 'java',
-            '.go': 'go',
-            '.rs': 'rust',
-            '.ts': 'javascript',
-            '.jsx': 'javascript',
-            '.tsx': 'javascript',
-            '.c': 'c',
-            '.cpp': 'cpp',
-            '.h': 'c',
-            '.hpp': 'cpp',
-            '.cs': 'csharp',
-            '.php': 'php',
-            '.rb': 'ruby',
-            '.swift': 'swift',
-            '.kt': 'kotlin',
-            '.ktm': 'kotlin',
-            '.html': 'html',
-            '.css': 'css',
-            '.scss': 'css',
-            '.sass': 'css',
-            '.less': 'css'
-        }
-        return ext_to_lang.get(ext, 'unknown')
+        return EXT_TO_LANG.get(ext, 'unknown')
 
     @classmethod
     def preprocess_code(cls, code: str, file_path: str) -> str:
@@ -267,27 +326,15 @@ class QueryProcessor:
             return code
 
         language = cls.detect_language(file_path)
-        indent_pattern = re.compile(r'^[ \t]+', re.MULTILINE)
-        indents = indent_pattern.findall(code)
-
-        if language in COMMON_PATTERNS['block_comments']:
-            code = re.sub(
-                COMMON_PATTERNS['block_comments'][language],
-                '',
-                code
-            )
-
-        if language in COMMON_PATTERNS['inline_comments']:
-            code = re.sub(
-                COMMON_PATTERNS['inline_comments'][language],
-                '',
-                code
-            )
-
-        code = re.sub(COMMON_PATTERNS['empty_lines'], '\n', code)
-        code = re.sub(
-            COMMON_PATTERNS['trailing_whitespace'], '', code, flags=re.MULTILINE)
-        code = re.sub(COMMON_PATTERNS['multiple_spaces'], ' ', code)
+        indents = INDENT_PATTERN.findall(code)
+
+        comment_pattern = COMPILED_COMMENT_PATTERNS.get(language)
+        if comment_pattern is not None:
+            code = comment_pattern.sub('', code)
+
+        code = EMPTY_LINES_PATTERN.sub('\n', code)
+        code = TRAILING_WHITESPACE_PATTERN.sub('', code)
+        code = MULTIPLE_SPACES_PATTERN.sub(' ', code)
 
         lines = code.split('\n')
         for i, indent in enumerate(indents):
@@ -297,10 +344,16 @@ class QueryProcessor:
         return '\n'.join(lines)
 
     @classmethod
-    def create_prompt(cls, query: str, content: str, prompt_type: PromptType,
+    def create_prompt(cls, query: str, content: str | Sequence[str], prompt_type: PromptType,
                       prompt_provider: PromptProviderType) -> str:
         """
         Create a prompt for the language model based on the query and code content.
+
+        Content may be given as the list of per-file pieces of a batch; they are
+        joined exactly once, here, when the prompt is rendered.
         """
+        if not isinstance(content, str):
+            content = "".join(content)
+
         prompt_func = get_prompt_function(prompt_type, prompt_provider)
-        return prompt_func(query, content)
+        return prompt_func(code_context=content, query=query)
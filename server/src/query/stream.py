@@ -1,14 +1,20 @@
-from typing import Optional
+import asyncio
+import logging
+from typing import AsyncGenerator, AsyncIterator, Optional
 from dataclasses import dataclass
 
 from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import BaseMessageChunk
 
-from vector import EmbeddingManager
-from query import QueryProcessor
+from vector import EmbeddingManager, SearchResult
+from .query import QueryProcessor
+from .usage import UsageCallbackHandler
 from prompt import PromptType, PromptProviderType
 
+logger = logging.getLogger(__name__)
 
-@dataclass
+
+@dataclass(slots=True)
 class CodeAnalysis:
     """Represents the semantic analysis of code."""
     file_path: str
@@ -18,9 +24,12 @@ class CodeAnalysis:
     implementation_notes: list[str]
 
 
-@dataclass
+@dataclass(slots=True)
 class StreamingResult:
+    """A piece of streamed analysis text, optionally tied to the code it describes."""
     text: str
+    source_file: str = ""
+    relevance_score: float = 0.0
 
 
 class StreamQueryProcessor(QueryProcessor):
@@ -30,9 +39,29 @@ class StreamQueryProcessor(QueryProcessor):
     """
 
     def __init__(self, embedding_manager: EmbeddingManager, llm: BaseChatModel, max_results: int = 10,
-                 min_relevance_score: float = 0.5, max_batch_tokens: int = 5000):
-        super().__init__(embedding_manager, llm, max_results, min_relevance_score)
+                 min_relevance_score: float = 0.5, max_batch_tokens: int = 5000,
+                 max_total_tokens: Optional[int] = None,
+                 flush_chars: int = 8192, flush_interval_s: float = 0.025,
+                 keyword_results: int = 3, min_keyword_score: float = 0.5):
+        """
+        Initialize the StreamQueryProcessor.
+
+        Streamed LLM chunks are buffered and yielded together once ``flush_chars``
+        characters have accumulated or ``flush_interval_s`` seconds have passed since
+        the last yield. Small values give a "typing" feel, larger ones fewer results.
+
+        Up to ``keyword_results`` keyword matches are analysed first, while the
+        semantic search is still running; 0 waits for the semantic search instead.
+        Keyword scores are the fraction of query words a text contains, so they
+        are filtered by ``min_keyword_score`` rather than ``min_relevance_score``.
+        """
+        super().__init__(embedding_manager, llm, max_results, min_relevance_score,
+                         max_total_tokens=max_total_tokens)
         self.max_batch_tokens = max_batch_tokens
+        self.flush_chars = flush_chars
+        self.flush_interval_s = flush_interval_s
+        self.keyword_results = keyword_results
+        self.min_keyword_score = min_keyword_score
 
     async def stream_analysis(self, query: str,
                               prompt_type: Optional[PromptType] = PromptType.AGGREGATE,
@@ -41,7 +70,12 @@ class StreamQueryProcessor(QueryProcessor):
         Performs streaming analysis of code based on a natural language query.
 
         This method searches for relevant code snippets using semantic search and processes them in batches,
-        streaming the analysis results as they become available.
+        streaming the analysis results as they become available. No further batches are
+        started once the tokens reported by the stream exceed ``max_total_tokens``.
+
+        Keyword matches from the embedding manager are streamed first while the
+        semantic search runs in the background; semantic results that were already
+        analysed as keyword matches are skipped.
 
         Args:
             query (str): The natural language query to analyze code against
@@ -57,31 +91,144 @@ class StreamQueryProcessor(QueryProcessor):
             Exception: If there is an error searching the vector database or processing results
         """
         try:
-            search_results = await self._get_similar_results(query)
+            usage = UsageCallbackHandler()
+            search = asyncio.create_task(self._get_similar_results(query))
+
+            try:
+                shortlist = await self._get_keyword_results(query)
+                async for result in self._stream_batches(query, shortlist, prompt_type, prompt_provider, usage):
+                    yield result
+
+                seen = {result.vector_id for result in shortlist}
+                search_results = [result for result in await search
+                                  if result.vector_id not in seen]
+                async for result in self._stream_batches(query, search_results, prompt_type, prompt_provider, usage):
+                    yield result
+            finally:
+                search.cancel()
+                # Retrieve the search's outcome, so a failure after which it was
+                # no longer needed is not reported as never retrieved
+                await asyncio.gather(search, return_exceptions=True)
+
+        except Exception:
+            logger.exception("Error searching vector db")
+            return
 
-            batch_index = 0
-            curr_index = 0
+    async def _get_keyword_results(self, query: str) -> list[SearchResult]:
+        """
+        Keyword matches for the query, preprocessed like the semantic results.
+        """
+        if self.keyword_results <= 0:
+            return []
 
-            while curr_index < len(search_results):
-                print(curr_index, len(search_results))
-                batch = self._create_batch(curr_index, search_results)
+        results = await self.embedding_manager.keyword_search(query, limit=self.keyword_results)
+        if not results:
+            return []
+        return await asyncio.to_thread(self._batch_preprocess, results, self.min_keyword_score)
 
-                if not batch:
-                    print("No batch found")
-                    break
+    async def _stream_batches(self, query: str, search_results: list[SearchResult],
+                              prompt_type: PromptType, prompt_provider: PromptProviderType,
+                              usage: UsageCallbackHandler) -> AsyncGenerator[StreamingResult, None]:
+        """
+        Streams the LLM analysis of the search results, one batch at a time.
+
+        Stops before the next batch once ``usage`` exceeds ``max_total_tokens``.
+        """
+        if not search_results or usage.exceeds(self.max_total_tokens):
+            return
+
+        batch_index = 0
+        curr_index = 0
 
-                prompt = self.create_prompt(query, "".join(
-                    batch.contents), prompt_type, prompt_provider)
+        prompts: asyncio.Queue = asyncio.Queue(maxsize=2)
+        producer = asyncio.create_task(self._produce_prompts(
+            query, search_results, prompt_type, prompt_provider, prompts))
 
-                async for chunk in self.llm.astream(prompt):
+        try:
+            while (item := await prompts.get()) is not None:
+                if isinstance(item, Exception):
+                    raise item
+
+                if usage.exceeds(self.max_total_tokens):
+                    logger.warning("Token budget exceeded: %d tokens used", usage.total_tokens)
+                    break
+
+                prompt, batch = item
+                async for text in self._buffer_stream(self.llm.astream(prompt), usage):
                     yield StreamingResult(
-                        text=chunk.content
+                        text=text
                     )
 
                 curr_index = batch.metadata['end_index']
                 batch_index += 1
+        finally:
+            producer.cancel()
+            # Wait for it to finish, so it neither outlives the stream nor leaves
+            # an exception that is never retrieved
+            await asyncio.gather(producer, return_exceptions=True)
+
+        logger.debug("Streamed %d results and %d batches", curr_index, batch_index)
+
+    async def _produce_prompts(self, query: str, search_results: list[SearchResult],
+                               prompt_type: PromptType, prompt_provider: PromptProviderType,
+                               prompts: asyncio.Queue) -> None:
+        """
+        Builds the batch prompts for ``stream_analysis`` and puts them on the queue.
+
+        Runs as a separate task so the next prompt is ready while the LLM is still
+        streaming the current batch. Each item is a ``(prompt, batch)`` tuple; the
+        queue is closed with ``None``, or with the exception that stopped the producer.
+        """
+        try:
+            offsets = self._batch_offsets(search_results)
+            curr_index = 0
+
+            while curr_index < len(search_results):
+                logger.debug("Batching from %d/%d", curr_index, len(search_results))
+                batch = self._create_batch(curr_index, search_results, offsets)
+
+                if not batch:
+                    logger.debug("No batch found")
+                    break
+
+                prompt = self.create_prompt(
+                    query, batch.contents, prompt_type, prompt_provider)
+                await prompts.put((prompt, batch))
+                curr_index = batch.metadata['end_index']
 
-            print(f"Streamed {curr_index} results and {batch_index} batches")
         except Exception as e:
-            print(f"Error searching vector db: {e}")
+            await prompts.put(e)
             return
+
+        await prompts.put(None)
+
+    async def _buffer_stream(self, stream: AsyncIterator[BaseMessageChunk],
+                             usage: UsageCallbackHandler) -> AsyncGenerator[str, None]:
+        """
+        Joins streamed LLM chunks into larger pieces of text.
+
+        A piece is yielded once ``flush_chars`` characters are buffered or
+        ``flush_interval_s`` seconds have passed since the last one; whatever is
+        left is yielded when the stream ends. Token usage is recorded per chunk.
+        """
+        loop = asyncio.get_running_loop()
+        buffer: list[str] = []
+        buffered_chars = 0
+        last_flush = loop.time()
+
+        async for chunk in stream:
+            usage.add_usage(getattr(chunk, "usage_metadata", None))
+            if chunk.content:
+                buffer.append(chunk.content)
+                buffered_chars += len(chunk.content)
+
+            now = loop.time()
+            if buffer and (buffered_chars >= self.flush_chars
+                           or now - last_flush >= self.flush_interval_s):
+                yield "".join(buffer)
+                buffer.clear()
+                buffered_chars = 0
+                last_flush = now
+
+        if buffer:
+            yield "".join(buffer)
@@ -0,0 +1,38 @@
+from typing import Any, Optional
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+
+
+class UsageCallbackHandler(BaseCallbackHandler):
+    """
+    Accumulates the tokens spent across every LLM call it is attached to.
+
+    Usage is read from the provider's ``token_usage`` report when present, falling
+    back to the ``usage_metadata`` LangChain attaches to chat messages.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.total_tokens = 0
+
+    def on_llm_end(self, response: LLMResult, **kwargs: Any) -> None:
+        """Add the token usage of a finished LLM call to the running total."""
+        token_usage = (response.llm_output or {}).get("token_usage") or {}
+        if "total_tokens" in token_usage:
+            self.total_tokens += token_usage["total_tokens"]
+            return
+
+        for generations in response.generations:
+            for generation in generations:
+                message = getattr(generation, "message", None)
+                self.add_usage(getattr(message, "usage_metadata", None))
+
+    def add_usage(self, usage_metadata: Optional[dict[str, Any]]) -> None:
+        """Add the ``total_tokens`` of a usage metadata dict, e.g. from a stream chunk."""
+        if usage_metadata:
+            self.total_tokens += usage_metadata.get("total_tokens", 0)
+
+    def exceeds(self, budget: Optional[int]) -> bool:
+        """Whether the tokens spent so far are over the given budget."""
+        return budget is not None and self.total_tokens > budget
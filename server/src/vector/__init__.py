@@ -1,4 +1,4 @@
-from .manager import EmbeddingManager, EmbeddingProvider
+from .manager import EmbeddingManager, EmbeddingProvider, InMemoryEmbeddingManager
 
 from .embedding import EmbeddingProviderConfig, create_embedding_provider, EmbeddingProviderType, OpenAIEmbeddingProvider
 
@@ -12,6 +12,7 @@ from .utils import create_file_content_map
 
 __all__ = [
     "EmbeddingManager",
+    "InMemoryEmbeddingManager",
     "EmbeddingProvider",
     "EmbeddingProviderConfig",
     "create_embedding_provider",
@@ -113,6 +113,7 @@ class FileManager:
                 await self.__process_file(file_path)
 
             await self.batch_queue.join()
+            await self.embedding_manager.flush()
             logger.info("File manager stopped successfully")
         except Exception as e:
             logger.error(f"Error stopping file manager: {e}")
@@ -1,9 +1,16 @@
 import time
+import asyncio
+import logging
+import dataclasses
 from typing import Optional
 
+import numpy as np
 
+from .cache import LRUCache
 from .embedding import EmbeddingProvider
-from .vector import VectorStore, EmbeddingVector, SearchResult
+from .vector import VectorStore, EmbeddingVector, SearchResult, keyword_terms, rank_keywords
+
+logger = logging.getLogger(__name__)
 
 
 class EmbeddingManager:
@@ -11,7 +18,9 @@ class EmbeddingManager:
     Manages the coordination between vector stores and embedding providers.
     """
 
-    def __init__(self, embedding_provider: EmbeddingProvider, vector_store: VectorStore, batch_size: int = 100) -> None:
+    def __init__(self, embedding_provider: EmbeddingProvider, vector_store: VectorStore, batch_size: int = 100,
+                 cache_size: int = 100, cache_ttl: Optional[float] = 60.0,
+                 coalesce_window: float = 0.005) -> None:
         """
         Initialize the embedding manager.
 
@@ -19,11 +28,25 @@ class EmbeddingManager:
             embedding_provider (EmbeddingProvider): The embedding provider to use.
             vector_store (VectorStore): The vector store to use.
             batch_size (int): The batch size for embedding.
+            cache_size (int): Number of query embeddings and search results cached.
+            cache_ttl (Optional[float]): Seconds a cached entry stays valid.
+            coalesce_window (float): Seconds to collect concurrent searches into one
+                batched store query. 0 sends every search to the store on its own.
         """
         self.embedding_provider = embedding_provider
         self.batch_size = batch_size
         self.vector_store = vector_store
 
+        self._query_cache = LRUCache(maxsize=cache_size, ttl=cache_ttl)
+        self._search_cache = LRUCache(maxsize=cache_size, ttl=cache_ttl)
+        # Part of every search cache key, bumped whenever the store changes so
+        # results cached before the change are never served again.
+        self._generation = 0
+
+        self.coalesce_window = coalesce_window
+        self._pending_queries: list[tuple[list[float], int, asyncio.Future]] = []
+        self._flush_task: Optional[asyncio.Task] = None
+
     async def add_texts(self, texts: list[str], metadatas: Optional[list[dict]] = None) -> None:
         """
         Add texts to the vector store.
@@ -45,8 +68,9 @@ class EmbeddingManager:
                 vectors.append(vector)
 
             await self.vector_store.add_vectors(vectors)
+            self._generation += 1
         except Exception as e:
-            print(f"Error adding texts to vector store: {e}")
+            logger.exception("Error adding texts to vector store")
             raise e
 
     async def delete_vectors(self, ids: list[str]) -> None:
@@ -54,19 +78,275 @@ class EmbeddingManager:
         Delete vectors from the vector store.
         """
         await self.vector_store.delete(ids)
+        self._generation += 1
+
+    async def flush(self) -> None:
+        """
+        Persist any writes the vector store has deferred.
+        """
+        if self.vector_store is not None:
+            await self.vector_store.flush()
 
     async def similarity_search(self, query: str, limit: int = 10, filter: Optional[dict] = None) -> list[SearchResult]:
         """
         Perform a similarity search on the vector store.
+
+        Results are cached per query, limit and filter until the store changes, so
+        repeated queries skip both the embedding call and the index search.
         """
 
         try:
-            query_embedding = await self.embedding_provider.embed_query(query)
+            key = (query, limit, repr(filter), self._generation)
+            cached = self._search_cache.get(key)
+            if cached is None:
+                query_embedding = await self._embed_query(query)
+                cached = await self._query_store(query_embedding, limit, filter)
+                self._search_cache.set(key, cached)
+
+            # Callers rewrite result fields in place, so never hand out cached objects
+            return [dataclasses.replace(result) for result in cached]
+        except Exception as e:
+            logger.exception("Error performing similarity search")
+            raise e
+
+    async def keyword_search(self, query: str, limit: int = 10) -> list[SearchResult]:
+        """
+        Return a quick shortlist of texts sharing words with the query.
+
+        Meant to be answered before the embedding round trip of a similarity
+        search completes. Scores are the fraction of query words matched, not
+        similarities; stores that keep no texts return no results.
+        """
+        return await self.vector_store.keyword_search(query, limit=limit)
+
+    async def _query_store(self, query_embedding: list[float], limit: int,
+                           filter: Optional[dict] = None) -> list[SearchResult]:
+        """
+        Query the vector store, batching searches that arrive within the coalesce window.
+
+        Filtered searches are sent on their own since the batch shares one filter.
+        """
+        if filter is not None or self.coalesce_window <= 0:
             return await self.vector_store.query(
                 query_vector=query_embedding,
                 k=limit,
                 filter=filter,
             )
+
+        future = asyncio.get_running_loop().create_future()
+        self._pending_queries.append((query_embedding, limit, future))
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_queries())
+        return await future
+
+    async def _flush_queries(self) -> None:
+        """
+        Wait for the coalesce window, then run every pending search as one batch.
+        """
+        await asyncio.sleep(self.coalesce_window)
+        pending, self._pending_queries = self._pending_queries, []
+        self._flush_task = None
+
+        try:
+            k = max(limit for _, limit, _ in pending)
+            results = await self.vector_store.query_batch(
+                [embedding for embedding, _, _ in pending], k=k)
+        except Exception as e:
+            for _, _, future in pending:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, limit, future), result in zip(pending, results):
+            if not future.done():
+                future.set_result(result[:limit])
+
+    async def _embed_query(self, query: str) -> list[float]:
+        """
+        Embed a query, reusing the embedding of a recently seen identical query.
+        """
+        embedding = self._query_cache.get(query)
+        if embedding is None:
+            embedding = await self.embedding_provider.embed_query(query)
+            self._query_cache.set(query, embedding)
+        return embedding
+
+
+class InMemoryEmbeddingManager(EmbeddingManager):
+    """
+    Embedding manager that keeps every vector in RAM as one contiguous matrix.
+
+    Meant for small corpora (roughly < 100K vectors) where the cost of setting up
+    an index query outweighs the math itself. Vectors are L2-normalized once when
+    added, so a search is a single matrix-vector product followed by a partial
+    sort for the top results.
+    """
+
+    # Rows upcast at a time when scoring a float16 matrix
+    SCORE_BLOCK_ROWS = 1024
+
+    def __init__(self, embedding_provider: EmbeddingProvider,
+                 vector_store: Optional[VectorStore] = None,
+                 batch_size: int = 100,
+                 dtype: np.dtype = np.float32) -> None:
+        """
+        Initialize the in-memory embedding manager.
+
+        Parameters:
+            embedding_provider (EmbeddingProvider): The embedding provider to use.
+            vector_store (Optional[VectorStore]): Optional store that additions and
+                deletions are mirrored to for persistence.
+            batch_size (int): The batch size for embedding.
+            dtype (np.dtype): Storage type of the vector matrix. ``np.float16`` halves
+                the memory footprint at a small cost in recall.
+        """
+        super().__init__(embedding_provider, vector_store, batch_size)
+        self.dtype = np.dtype(dtype)
+        self.vectors: np.ndarray = np.empty((0, 0), dtype=self.dtype)
+        self.ids: list[str] = []
+        self.texts: list[str] = []
+        self.metadatas: list[dict] = []
+
+    def load_vectors(self, vectors: list[EmbeddingVector]) -> None:
+        """
+        Append already embedded vectors, e.g. the contents of a persisted store.
+        """
+        if not vectors:
+            return
+
+        matrix = np.asarray([v.vector for v in vectors], dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        matrix /= np.where(norms == 0, 1, norms)
+        matrix = matrix.astype(self.dtype, copy=False)
+
+        if self.vectors.size:
+            self.vectors = np.ascontiguousarray(
+                np.concatenate((self.vectors, matrix)))
+        else:
+            self.vectors = np.ascontiguousarray(matrix)
+
+        for v in vectors:
+            self.ids.append(v.id)
+            self.texts.append(v.text)
+            self.metadatas.append(v.metadata)
+
+    async def add_texts(self, texts: list[str], metadatas: Optional[list[dict]] = None) -> None:
+        """
+        Embed texts and add them to the in-memory matrix.
+        """
+        try:
+            embeddings = await self.embedding_provider.embed_documents(texts)
+            vectors = [
+                EmbeddingVector(
+                    id=f"vector_{time.time()}_{i}",
+                    vector=embedding,
+                    metadata=metadatas[i] if metadatas else {},
+                    text=text,
+                )
+                for i, (text, embedding) in enumerate(zip(texts, embeddings))
+            ]
+
+            self.load_vectors(vectors)
+            if self.vector_store is not None:
+                await self.vector_store.add_vectors(vectors)
+        except Exception as e:
+            logger.exception("Error adding texts to vector store")
+            raise e
+
+    async def delete_vectors(self, ids: list[str]) -> None:
+        """
+        Delete vectors from the in-memory matrix (and the backing store, if any).
+        """
+        to_delete = set(ids)
+        keep = np.fromiter((i not in to_delete for i in self.ids),
+                           dtype=bool, count=len(self.ids))
+
+        self.vectors = self.vectors[keep]
+        self.ids = [v for v, k in zip(self.ids, keep) if k]
+        self.texts = [v for v, k in zip(self.texts, keep) if k]
+        self.metadatas = [v for v, k in zip(self.metadatas, keep) if k]
+
+        if self.vector_store is not None:
+            await self.vector_store.delete(ids)
+
+    async def keyword_search(self, query: str, limit: int = 10) -> list[SearchResult]:
+        """
+        Rank stored texts by the fraction of query words (3+ characters) they contain.
+
+        No embedding is needed, so this answers well before a similarity search.
+        The scan runs in a worker thread to keep the event loop free meanwhile.
+        """
+        terms = keyword_terms(query)
+        if not terms or not self.ids or limit <= 0:
+            return []
+
+        ranked = await asyncio.to_thread(rank_keywords, self.texts, terms, limit)
+        return [
+            SearchResult(
+                text=self.texts[i],
+                metadata=self.metadatas[i],
+                score=score,
+                vector_id=self.ids[i],
+                source_file=self.metadatas[i].get("source", "unknown"),
+            )
+            for score, i in ranked
+        ]
+
+    def _score(self, q: np.ndarray) -> np.ndarray:
+        """
+        Cosine similarity of every stored vector with the normalized query ``q``.
+
+        NumPy has no BLAS kernel for float16, so a float16 matrix is upcast to
+        float32 one block of rows at a time; memory stays halved while the
+        product still runs through BLAS.
+        """
+        if self.dtype == np.float32:
+            return self.vectors @ q
+
+        scores = np.empty(len(self.vectors), dtype=np.float32)
+        for start in range(0, len(self.vectors), self.SCORE_BLOCK_ROWS):
+            block = self.vectors[start:start + self.SCORE_BLOCK_ROWS]
+            np.matmul(block.astype(np.float32), q, out=scores[start:start + len(block)])
+        return scores
+
+    async def similarity_search(self, query: str, limit: int = 10, filter: Optional[dict] = None) -> list[SearchResult]:
+        """
+        Rank every stored vector by cosine similarity to the query.
+
+        Scores are cosine similarities, so higher means more relevant.
+        """
+        try:
+            if not self.ids or limit <= 0:
+                return []
+
+            q = np.asarray(await self._embed_query(query), dtype=np.float32)
+            norm = np.linalg.norm(q)
+            if norm:
+                q /= norm
+
+            scores = self._score(q)
+
+            if filter:
+                mask = np.fromiter(
+                    (all(md.get(key) == value for key, value in filter.items())
+                     for md in self.metadatas),
+                    dtype=bool, count=len(self.metadatas))
+                scores = np.where(mask, scores, -np.inf)
+
+            limit = min(limit, len(scores))
+            idx = np.argpartition(-scores, limit - 1)[:limit]
+            idx = idx[np.argsort(-scores[idx])]
+
+            return [
+                SearchResult(
+                    text=self.texts[i],
+                    metadata=self.metadatas[i],
+                    score=float(scores[i]),
+                    vector_id=self.ids[i],
+                    source_file=self.metadatas[i].get("source", "unknown"),
+                )
+                for i in idx.tolist() if np.isfinite(scores[i])
+            ]
         except Exception as e:
-            print(f"Error performing similarity search: {e}")
+            logger.exception("Error performing similarity search")
             raise e
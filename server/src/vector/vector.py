@@ -1,24 +1,54 @@
 import os
+import re
+import json
+import heapq
+import logging
 import faiss
 import numpy as np
 import asyncio
-import aiofiles
 
 from abc import ABC, abstractmethod
+from contextlib import asynccontextmanager
 from dataclasses import dataclass
 from enum import Enum, auto
-from typing import Any, Optional
+from typing import Any, AsyncIterator, Callable, Optional
 from pathlib import Path
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import Engine
 from sqlalchemy.orm import sessionmaker
 
 from langchain_core.embeddings import Embeddings
 from langchain_openai import OpenAIEmbeddings
 from langchain_community.vectorstores import Chroma, FAISS, PGVector, Pinecone
 
+logger = logging.getLogger(__name__)
 
-@dataclass
+# One engine (and so one connection pool) per database, shared by every store
+_engine_cache: dict[str, Engine] = {}
+
+
+def keyword_terms(query: str) -> set[str]:
+    """The lowercased words of 3+ characters a keyword search looks for."""
+    return set(re.findall(r"\w{3,}", query.lower()))
+
+
+def rank_keywords(texts: list[str], terms: set[str], limit: int) -> list[tuple[float, int]]:
+    """
+    Top ``(score, index)`` pairs of the texts containing any of the terms.
+
+    The score is the fraction of the terms a text contains, between 0 and 1.
+    """
+    scored = []
+    for i, text in enumerate(texts):
+        lowered = text.lower()
+        hits = sum(term in lowered for term in terms)
+        if hits:
+            scored.append((hits / len(terms), i))
+    return heapq.nlargest(limit, scored)
+
+
+@dataclass(slots=True)
 class EmbeddingVector:
     """Represents an embedding vector with its metadata."""
     id: str
@@ -27,7 +57,7 @@ class EmbeddingVector:
     text: str
 
 
-@dataclass
+@dataclass(slots=True)
 class SearchResult:
     """Represents a search result from the vector store."""
     text: str
@@ -37,6 +67,54 @@ class SearchResult:
     source_file: str
 
 
+class _ReadWriteLock:
+    """
+    An asyncio lock shared by any number of readers or held by a single writer.
+
+    Waiting writers keep new readers out, so a steady stream of searches cannot
+    starve an add or delete.
+    """
+
+    def __init__(self) -> None:
+        self._readers = 0
+        self._writer = False
+        self._waiting_writers = 0
+        self._cond = asyncio.Condition()
+
+    @asynccontextmanager
+    async def read(self) -> AsyncIterator[None]:
+        """Hold the lock shared with other readers."""
+        async with self._cond:
+            await self._cond.wait_for(lambda: not self._writer and not self._waiting_writers)
+            self._readers += 1
+        try:
+            yield
+        finally:
+            async with self._cond:
+                self._readers -= 1
+                if not self._readers:
+                    self._cond.notify_all()
+
+    @asynccontextmanager
+    async def write(self) -> AsyncIterator[None]:
+        """Hold the lock exclusively."""
+        async with self._cond:
+            self._waiting_writers += 1
+            try:
+                await self._cond.wait_for(lambda: not self._writer and not self._readers)
+            finally:
+                self._waiting_writers -= 1
+                # Readers held back by this writer may go if it gave up waiting
+                self._cond.notify_all()
+            self._writer = True
+        try:
+            yield
+        finally:
+            async with self._cond:
+                self._writer = False
+                self._cond.notify_all()
+
+
 class VectorStoreType(Enum):
     """
     Enum for the type of vector store.
@@ -47,7 +125,7 @@ class VectorStoreType(Enum):
     PINECONE = "pinecone"
 
 
-@dataclass
+@dataclass(slots=True)
 class VectorStoreConfig:
     """
     Configuration for a vector store.
@@ -76,11 +154,30 @@ class VectorStore(ABC):
         """Query the vector store."""
         pass
 
+    async def query_batch(self, query_vectors: list[list[float]], k: int = 10,
+                          filter: Optional[dict] = None) -> list[list[SearchResult]]:
+        """
+        Query the vector store with several vectors at once.
+
+        Returns one result list per query vector, in order. Stores that can search
+        many vectors in a single call should override this.
+        """
+        return [await self.query(query_vector, k=k, filter=filter) for query_vector in query_vectors]
+
     @abstractmethod
     async def delete(self, ids: list[str]) -> None:
         """Delete vectors from the vector store."""
         pass
 
+    async def keyword_search(self, query: str, limit: int = 10) -> list[SearchResult]:
+        """
+        Rank the stored texts by the words they share with the query.
+
+        Scores are the fraction of query words matched (see ``rank_keywords``),
+        not similarities. Stores that keep no texts return no results.
+        """
+        return []
+
     @abstractmethod
     async def clear(self) -> None:
         """Clear all vectors from the store."""
@@ -91,6 +188,10 @@ class VectorStore(ABC):
         """Get stats about the vector store."""
         pass
 
+    async def flush(self) -> None:
+        """Persist any pending writes. Stores that defer writes should override this."""
+        pass
+
 
 class ChromaVectorStore(VectorStore):
     """
@@ -140,67 +241,327 @@ class FAISSVectorStore(VectorStore):
     Vector store using FAISS.
     """
 
+    SQ_TYPES = {
+        "int8": faiss.ScalarQuantizer.QT_8bit,
+        "float16": faiss.ScalarQuantizer.QT_fp16,
+    }
+
     def __init__(self, dimension: int,
                  index_path: Path,
-                 embedding_model: Optional[Embeddings] = None) -> None:
+                 embedding_model: Optional[Embeddings] = None,
+                 hnsw_m: int = 32,
+                 ef_construction: int = 200,
+                 save_delay: float = 0.5,
+                 use_gpu: bool = False,
+                 quantization: Optional[str] = None,
+                 train_size: int = 10_000) -> None:
+        """
+        Initialize the FAISS store.
+
+        Vectors are indexed with HNSW for sub-linear approximate search. ``hnsw_m``
+        is the number of graph neighbours per node and ``ef_construction`` the
+        search depth used while building the graph; higher values trade memory and
+        insert time for recall.
+
+        Changes are written to disk at most once per ``save_delay`` seconds, so bulk
+        loads made of many small calls rewrite the index once. Call ``flush()``
+        (or ``close()``) before shutting down to persist the last changes.
+
+        With ``use_gpu`` and a GPU build of FAISS, vectors are searched by brute
+        force on the first GPU instead, which beats HNSW for large query batches.
+        Falls back to the CPU index when no GPU is available.
+
+        ``quantization`` stores the vectors inside the HNSW index as ``"int8"`` or
+        ``"float16"`` instead of float32, cutting the memory read per search by 4x
+        or 2x for a small loss in recall. The quantizer learns the value range
+        from the vectors it is trained on, so vectors are kept in a flat float32
+        index, and searched there, until ``train_size`` of them have been added or
+        ``flush()`` is called; the quantized index is then trained on all of them.
+        It is retrained whenever it is rebuilt. The GPU index is not quantized, so
+        ``use_gpu`` and ``quantization`` cannot be combined.
+        """
         self.dimension = dimension
         self.index_path = index_path.resolve()
+        # The ids, texts and metadata, and the float32 matrix, are saved next to
+        # the index; FAISS itself only stores the vectors
+        self._meta_path = self.index_path.with_name(self.index_path.name + ".meta.json")
+        self._mat_path = self.index_path.with_name(self.index_path.name + ".vectors.npy")
         self.embedding_model = embedding_model or OpenAIEmbeddings()
-
-        self.index = faiss.IndexFlatL2(dimension)
+        self.hnsw_m = hnsw_m
+        self.ef_construction = ef_construction
+        if quantization is not None and quantization not in self.SQ_TYPES:
+            raise ValueError(
+                f"Unsupported quantization {quantization!r}, expected one of {list(self.SQ_TYPES)}")
+        if quantization is not None and use_gpu:
+            raise ValueError("quantization is not supported with use_gpu; the GPU index is a flat float32 one")
+        self.quantization = quantization
+        self.train_size = train_size
+        self._gpu_res = self.__gpu_resources() if use_gpu else None
+
+        self.index = self.__new_index()
         self.id_map: dict[str, int] = {}
         self.vectors: list[EmbeddingVector] = []
-        asyncio.create_task(self.__load_index())
-
-    async def query(self, query_vector: list[float], k: int = 10, filter: Optional[dict] = None) -> list[SearchResult]:
-        """Query the FAISS store and return the top k results."""
+        # Row i holds the embedding of self.vectors[i]; rows past len(self.vectors)
+        # are spare capacity so appends do not reallocate every time.
+        self._mat = np.empty((0, dimension), dtype=np.float32)
+        # FAISS calls run in worker threads. Searches and saves only read the index
+        # and may run together; adds, deletes and clears hold it exclusively.
+        self._index_lock = _ReadWriteLock()
+        # The index on disk is loaded lazily by the first operation; see _ensure_loaded
+        self._loaded = False
+        self._load_lock = asyncio.Lock()
+
+        self.save_delay = save_delay
+        self._save_pending = False
+        self._save_task: Optional[asyncio.Task] = None
+        # Saves run under the shared read lock; this keeps two of them from
+        # writing the same temporary files at once
+        self._save_lock = asyncio.Lock()
+
+    async def query(self, query_vector: list[float], k: int = 10, filter: Optional[dict] = None,
+                    ef_search: int = 64) -> list[SearchResult]:
+        """
+        Query the FAISS store and return the top k results.
+
+        ``ef_search`` is the HNSW search depth; raise it for better recall at the
+        cost of query time. It must be at least ``k`` to return k results.
+        """
         try:
+            await self._ensure_loaded()
 
             query_arr = np.array([query_vector], dtype=np.float32)
-            distances, indices = self.index.search(query_arr, k)
-
-            results = []
-            for distance, idx in zip(distances[0], indices[0]):
-                if idx < 0 or idx >= len(self.vectors):
-                    continue
+            async with self._index_lock.read():
+                distances, indices = await asyncio.to_thread(
+                    self.index.search, query_arr, k, params=self.__search_params(k, ef_search))
+                return self.__to_results(distances[0], indices[0])
+        except Exception as e:
+            raise RuntimeError(f"Failed to query FAISS: {str(e)}") from e
 
-                vector = self.vectors[idx]
+    async def query_batch(self, query_vectors: list[list[float]], k: int = 10,
+                          filter: Optional[dict] = None, ef_search: int = 64) -> list[list[SearchResult]]:
+        """
+        Query the FAISS store with many vectors in a single index search.
 
-                results.append(SearchResult(
-                    text=vector.text,
-                    metadata=vector.metadata,
-                    score=float(distance),
-                    vector_id=vector.id,
-                    source_file=vector.metadata["source"]
-                ))
+        The search runs in a worker thread so the event loop stays responsive.
+        """
+        try:
+            await self._ensure_loaded()
 
-            return results
+            query_arr = np.asarray(query_vectors, dtype=np.float32)
+            async with self._index_lock.read():
+                distances, indices = await asyncio.to_thread(
+                    self.index.search, query_arr, k, params=self.__search_params(k, ef_search))
+                return [self.__to_results(d, i) for d, i in zip(distances, indices)]
         except Exception as e:
             raise RuntimeError(f"Failed to query FAISS: {str(e)}") from e
 
-    async def __load_index(self) -> None:
-        """Load the FAISS index from disk if it exists."""
-        try:
-            idx_path = self.index_path
-            if idx_path.exists():
-                async with aiofiles.open(idx_path, 'rb') as f:
-                    index_data = await f.read()
-                self.index = await asyncio.to_thread(
-                    faiss.deserialize_index, index_data
+    async def keyword_search(self, query: str, limit: int = 10) -> list[SearchResult]:
+        """
+        Rank the stored texts by the fraction of query words they contain.
+
+        No embedding is needed, so this answers well before a similarity search.
+        The scan runs in a worker thread to keep the event loop free meanwhile.
+        """
+        terms = keyword_terms(query)
+        if not terms or limit <= 0:
+            return []
+
+        await self._ensure_loaded()
+        async with self._index_lock.read():
+            vectors = self.vectors
+            ranked = await asyncio.to_thread(
+                rank_keywords, [v.text for v in vectors], terms, limit)
+            return [
+                SearchResult(
+                    text=vectors[i].text,
+                    metadata=vectors[i].metadata,
+                    score=score,
+                    vector_id=vectors[i].id,
+                    source_file=vectors[i].metadata.get("source", "unknown"),
                 )
+                for score, i in ranked
+            ]
+
+    def __search_params(self, k: int, ef_search: int) -> Optional[faiss.SearchParameters]:
+        """Per-call search parameters for the current index type."""
+        if isinstance(self.index, faiss.IndexHNSW):
+            return faiss.SearchParametersHNSW(efSearch=max(ef_search, k))
+        return None
+
+    def __to_results(self, distances: np.ndarray, indices: np.ndarray) -> list[SearchResult]:
+        """
+        Convert one row of FAISS search output into search results.
+
+        Missing hits (index -1) are dropped with a single mask before the loop.
+        """
+        mask = (indices >= 0) & (indices < len(self.vectors))
+        vectors = self.vectors
+        return [
+            SearchResult(
+                text=vector.text,
+                metadata=vector.metadata,
+                score=distance,
+                vector_id=vector.id,
+                source_file=vector.metadata.get("source", "unknown"),
+            )
+            for vector, distance in zip(map(vectors.__getitem__, indices[mask].tolist()),
+                                        distances[mask].tolist())
+        ]
 
-        except Exception as e:
-            print(f"Warning: Failed to load FAISS index: {e}")
+    async def _ensure_loaded(self) -> None:
+        """
+        Load the persisted index before the first operation that needs it.
 
-    async def __save_index(self) -> None:
-        """Save the FAISS index to disk."""
+        Concurrent first callers wait on the same load instead of racing it or
+        running against the still-empty index.
+        """
+        if self._loaded:
+            return
+
+        async with self._load_lock:
+            if not self._loaded:
+                await self.__load_index()
+                self._loaded = True
+
+    async def __load_index(self) -> None:
+        """Load the FAISS index and its vector data from disk if they exist."""
         try:
-            index_data = await asyncio.to_thread(faiss.serialize_index, self.index)
-            async with aiofiles.open(self.index_path, 'wb') as f:
-                await f.write(index_data)
+            if self.index_path.exists():
+                await asyncio.to_thread(self.__read_store)
+
+        except Exception:
+            logger.exception("Failed to load FAISS index")
+
+    def __read_store(self) -> None:
+        """
+        Read the index, metadata and matrix written by ``__dump_index``.
+
+        Nothing is loaded unless all three exist and hold the same number of
+        vectors, since search results are looked up by position in the metadata.
+        """
+        if not (self._meta_path.exists() and self._mat_path.exists()):
+            logger.error("Not loading FAISS index %s: its vector metadata is missing",
+                         self.index_path)
+            return
+
+        index = faiss.read_index(str(self.index_path))
+        with open(self._meta_path, encoding="utf-8") as f:
+            meta = json.load(f)
+        mat = np.load(self._mat_path)
+
+        count = len(meta["ids"])
+        if not (index.ntotal == count == len(mat) == len(meta["texts"]) == len(meta["metadatas"])):
+            logger.error("Not loading FAISS index %s: it holds %d vectors but its metadata has %d",
+                         self.index_path, index.ntotal, count)
+            return
+
+        self.vectors = [
+            # The embedding itself lives in _mat
+            EmbeddingVector(id=id, vector=[], metadata=metadata, text=text)
+            for id, text, metadata in zip(meta["ids"], meta["texts"], meta["metadatas"])
+        ]
+        self.id_map = {id: i for i, id in enumerate(meta["ids"])}
+        self._mat = np.ascontiguousarray(mat, dtype=np.float32)
+        self.index = self.__to_device(index)
 
-        except Exception as e:
-            print(f"Warning: Failed to save FAISS index: {e}")
+    async def __save_index(self) -> None:
+        """
+        Schedule the FAISS index to be saved once the save delay has passed.
+
+        Later changes within the delay are covered by the same write.
+        """
+        self._save_pending = True
+        if self._save_task is None:
+            self._save_task = asyncio.create_task(self.__debounced_save())
+
+    async def __debounced_save(self) -> None:
+        """Wait for the save delay, then write the index if it is still pending."""
+        await asyncio.sleep(self.save_delay)
+        self._save_task = None
+        async with self._index_lock.read():
+            await self.__write_index()
+
+    async def flush(self) -> None:
+        """
+        Write any pending changes to disk now.
+
+        Vectors still waiting for the quantizer to be trained are moved into the
+        quantized index first, trained on however many there are.
+        """
+        if self.__is_staging() and self.vectors:
+            async with self._index_lock.write():
+                if self.__is_staging() and self.vectors:
+                    self.index = await asyncio.to_thread(
+                        self.__build_quantized, self._mat[:len(self.vectors)])
+                    self._save_pending = True
+
+        async with self._index_lock.read():
+            await self.__write_index()
+
+    async def close(self) -> None:
+        """Persist pending changes; the store should not be used afterwards."""
+        await self.flush()
+
+    async def __write_index(self) -> None:
+        """
+        Write the FAISS index to disk if a save is pending. Requires the index lock, shared or not.
+
+        The save stays pending if writing fails, so the next flush or change retries it.
+        """
+        async with self._save_lock:
+            if not self._save_pending:
+                return
+
+            try:
+                await asyncio.to_thread(self.__dump_index, self.index)
+            except Exception:
+                logger.exception("Failed to save FAISS index")
+                return
+            # No change can happen while the index lock is held
+            self._save_pending = False
+
+    def __dump_index(self, index: faiss.Index) -> None:
+        """
+        Write an index, with the metadata and matrix of its vectors, next to the index path.
+
+        Each file is written to a temporary file that then replaces the old one,
+        so a crash mid-write never leaves a truncated file behind. The index goes
+        last; files left from different saves hold different vector counts and
+        are refused on load.
+        """
+        if self._gpu_res is not None:
+            # GPU indexes cannot be written directly
+            index = faiss.index_gpu_to_cpu(index)
+
+        count = len(self.vectors)
+        meta = {
+            "ids": [v.id for v in self.vectors],
+            "texts": [v.text for v in self.vectors],
+            "metadatas": [v.metadata for v in self.vectors],
+        }
+
+        def write_meta(path: str) -> None:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(meta, f)
+
+        def write_mat(path: str) -> None:
+            with open(path, "wb") as f:
+                np.save(f, self._mat[:count])
+
+        self.__write_atomic(self._mat_path, write_mat)
+        self.__write_atomic(self._meta_path, write_meta)
+        self.__write_atomic(self.index_path, lambda path: faiss.write_index(index, path))
+
+    @staticmethod
+    def __write_atomic(path: Path, write: Callable[[str], None]) -> None:
+        """Write a file through a temporary file that replaces it once complete."""
+        tmp_path = path.with_name(path.name + ".tmp")
+        try:
+            write(str(tmp_path))
+            os.replace(tmp_path, path)
+        except Exception:
+            tmp_path.unlink(missing_ok=True)
+            raise
 
     async def add_vectors(self, vectors: list[EmbeddingVector]) -> None:
         """Add vectors to the FAISS store."""
@@ -208,47 +569,54 @@ class FAISSVectorStore(VectorStore):
             if not vectors:
                 return
 
-            vec_arr = np.array(
-                [v.vector for v in vectors], dtype=np.float32)
+            await self._ensure_loaded()
+            async with self._index_lock.write():
+                start_idx = len(self.vectors)
+                end_idx = start_idx + len(vectors)
+                self.__reserve(end_idx)
 
-            start_idx = len(self.vectors)
-            self.index.add(vec_arr)
+                self._mat[start_idx:end_idx] = [v.vector for v in vectors]
+                if self.__is_staging() and end_idx >= self.train_size:
+                    # Enough vectors to train on: move them all into the quantized index
+                    self.index = await asyncio.to_thread(self.__build_quantized, self._mat[:end_idx])
+                else:
+                    await asyncio.to_thread(self.index.add, self._mat[start_idx:end_idx])
 
-            for i, vector in enumerate(vectors):
-                self.id_map[vector.id] = start_idx + i
-                self.vectors.append(vector)
+                for i, vector in enumerate(vectors):
+                    self.id_map[vector.id] = start_idx + i
+                    self.vectors.append(vector)
 
-            await self.__save_index()
+                await self.__save_index()
 
         except Exception as e:
             raise RuntimeError(f"Failed to add vectors to FAISS: {e}")
 
     async def delete(self, ids: list[str]) -> None:
-        """Delete vectors from the FAISS store."""
-        try:
-            indices_to_delete = [self.id_map[id] for id in ids]
-            if not indices_to_delete:
-                return
+        """
+        Delete vectors from the FAISS store.
 
-            new_vectors = []
-            new_id_map = {}
+        The remaining rows are selected with a boolean mask, so a delete is a single
+        O(N) pass regardless of how many ids are removed. Unknown ids are ignored.
+        """
+        try:
+            await self._ensure_loaded()
+            async with self._index_lock.write():
+                indices_to_delete = np.fromiter(
+                    (self.id_map[id] for id in ids if id in self.id_map), dtype=np.int64)
+                if not indices_to_delete.size:
+                    return
 
-            for i, vector in enumerate(self.vectors):
-                if i not in indices_to_delete:
-                    new_id_map[vector.id] = len(new_vectors)
-                    new_vectors.append(vector)
+                keep = np.ones(len(self.vectors), dtype=bool)
+                keep[indices_to_delete] = False
 
-            # Rebuild the index with the new vectors
-            self.index = faiss.IndexFlatL2(self.dimension)
-            if new_vectors:
-                vectors_array = np.array(
-                    [v.vector for v in new_vectors], dtype=np.float32)
-                self.index.add(vectors_array)
+                self._mat = self._mat[:len(self.vectors)][keep]
+                self.vectors = [v for v, k in zip(self.vectors, keep.tolist()) if k]
+                self.id_map = {v.id: i for i, v in enumerate(self.vectors)}
 
-            self.vectors = new_vectors
-            self.id_map = new_id_map
+                # HNSW graphs do not support removal, so rebuild from the remaining vectors
+                self.index = await asyncio.to_thread(self.__build_index, self._mat)
 
-            await self.__save_index()
+                await self.__save_index()
 
         except Exception as e:
             raise RuntimeError(f"Failed to delete vectors from FAISS: {e}")
@@ -256,15 +624,89 @@ class FAISSVectorStore(VectorStore):
     async def clear(self) -> None:
         """Clear all vectors from the FAISS store."""
         try:
-            self.index = faiss.IndexFlatL2(self.dimension)
-            self.id_map = {}
-            self.vectors = []
-            await self.__save_index()
+            await self._ensure_loaded()
+            async with self._index_lock.write():
+                self.index = self.__new_index()
+                self.id_map = {}
+                self.vectors = []
+                self._mat = np.empty((0, self.dimension), dtype=np.float32)
+                await self.__save_index()
         except Exception as e:
             raise RuntimeError(f"Failed to clear FAISS store: {e}")
 
+    @staticmethod
+    def __gpu_resources() -> Optional[Any]:
+        """Allocate GPU resources, or return None if FAISS cannot use a GPU here."""
+        if not hasattr(faiss, "StandardGpuResources") or faiss.get_num_gpus() == 0:
+            logger.warning("use_gpu requested but no GPU is available to FAISS, using the CPU index")
+            return None
+        return faiss.StandardGpuResources()
+
+    def __to_device(self, index: faiss.Index) -> faiss.Index:
+        """Move a CPU index onto the GPU when one is in use and supports the index type."""
+        if self._gpu_res is None:
+            return index
+        try:
+            return faiss.index_cpu_to_gpu(self._gpu_res, 0, index)
+        except RuntimeError as e:
+            # e.g. an HNSW index saved by a CPU run; keep searching it on the CPU
+            logger.warning("Failed to move FAISS index to GPU: %s", e)
+            return index
+
+    def __new_index(self) -> faiss.Index:
+        """
+        Create an empty index with the store's build parameters.
+
+        HNSW graphs cannot run on a GPU, so the GPU index is a flat (exact) one.
+        A quantized store starts with a flat index too, holding vectors until
+        there are enough to train the quantizer on.
+        """
+        if self._gpu_res is not None:
+            return self.__to_device(faiss.IndexFlatL2(self.dimension))
+
+        if self.quantization is not None:
+            return faiss.IndexFlatL2(self.dimension)
+
+        index = faiss.IndexHNSWFlat(self.dimension, self.hnsw_m)
+        index.hnsw.efConstruction = self.ef_construction
+        return index
+
+    def __is_staging(self) -> bool:
+        """Whether vectors are held in a flat index until the quantizer can be trained."""
+        return self.quantization is not None and not isinstance(self.index, faiss.IndexHNSW)
+
+    def __build_quantized(self, mat: np.ndarray) -> faiss.Index:
+        """Create a quantized HNSW index trained on, and holding, the given vectors."""
+        index = faiss.IndexHNSWSQ(
+            self.dimension, self.SQ_TYPES[self.quantization], self.hnsw_m)
+        index.hnsw.efConstruction = self.ef_construction
+        index.train(mat)
+        index.add(mat)
+        return index
+
+    def __build_index(self, mat: np.ndarray) -> faiss.Index:
+        """Create a new index holding the given vectors."""
+        if self.quantization is not None and len(mat) >= self.train_size:
+            return self.__build_quantized(mat)
+
+        index = self.__new_index()
+        if len(mat):
+            index.add(mat)
+        return index
+
+    def __reserve(self, size: int) -> None:
+        """Grow the vector matrix geometrically so it can hold at least size rows."""
+        capacity = len(self._mat)
+        if size <= capacity:
+            return
+
+        mat = np.empty((max(2 * capacity, size), self.dimension), dtype=np.float32)
+        mat[:len(self.vectors)] = self._mat[:len(self.vectors)]
+        self._mat = mat
+
     async def get_stats(self) -> dict[str, Any]:
         """Get stats about the FAISS store."""
+        await self._ensure_loaded()
         return {
             "num_vectors": len(self.vectors),
             "dimension": self.dimension,
@@ -278,17 +720,22 @@ class PGVectorStore(VectorStore):
     """
 
     def __init__(self, connection_str: str, table_name: str = "embeddings", embedding_model: Optional[Embeddings] = None):
+        if not re.fullmatch(r"[A-Za-z_]\w*", table_name):
+            raise ValueError(f"Invalid table name: {table_name!r}")
+
         self.connection_str = connection_str
         self.table_name = table_name
         self.embedding_model = embedding_model or OpenAIEmbeddings()
 
-        self.engine = create_engine(connection_str)
+        self.engine = self.__get_engine(connection_str)
         self.session = sessionmaker(bind=self.engine)
 
-        with self.engine.connect() as conn:
+        with self.engine.begin() as conn:
+            conn.execute(text("CREATE EXTENSION IF NOT EXISTS vector"))
 
-            # create table if not exists
-            conn.execute(f"""
+            # create table if not exists; identifiers cannot be bound, so the
+            # table name is validated above instead
+            conn.execute(text(f"""
                 CREATE TABLE IF NOT EXISTS {self.table_name} (
                     id TEXT PRIMARY KEY,
                     vector vector({self.embedding_model.dimension}),
@@ -296,13 +743,22 @@ class PGVectorStore(VectorStore):
                     metadata JSONB,
                     created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
                 )
-            """)
+            """))
 
-            conn.execute(f"""
+            conn.execute(text(f"""
                 CREATE INDEX IF NOT EXISTS {self.table_name}_vector_idx
                 ON {self.table_name}
-                USING ivfflat (vector vector_cosine_ops)
-            """)
+                USING hnsw (vector vector_cosine_ops)
+            """))
+
+    @staticmethod
+    def __get_engine(connection_str: str) -> Engine:
+        """Return the shared engine for a database, creating it on first use."""
+        engine = _engine_cache.get(connection_str)
+        if engine is None:
+            engine = create_engine(connection_str, pool_size=10, pool_pre_ping=True)
+            _engine_cache[connection_str] = engine
+        return engine
 
     def _initialize_store(self) -> PGVector:
         return PGVector(embedding=self.config.embedding_model)
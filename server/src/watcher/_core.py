@@ -0,0 +1,195 @@
+"""
+Event types, ignore matching and coalescing shared by the sync and async watchers.
+"""
+import re
+from enum import Enum, auto
+from typing import Iterable, Optional, Protocol
+
+from watchdog import events
+
+
+class EventType(Enum):
+    """
+    Event types for the watcher.
+    """
+    FILE_CREATED = auto()
+    FILE_MODIFIED = auto()
+    FILE_DELETED = auto()
+    FILE_MOVED = auto()
+
+    def __str__(self):
+        return self._pretty
+
+
+# The display names are fixed, so they are formatted once rather than per call
+for _member in EventType:
+    _member._pretty = _member.name.replace('_', ' ').title()
+del _member
+
+
+# watchdog's event_type strings for the events the watchers report
+_EVENT_TYPE_MAP = {
+    events.EVENT_TYPE_CREATED: EventType.FILE_CREATED,
+    events.EVENT_TYPE_MODIFIED: EventType.FILE_MODIFIED,
+    events.EVENT_TYPE_DELETED: EventType.FILE_DELETED,
+    events.EVENT_TYPE_MOVED: EventType.FILE_MOVED,
+}
+
+
+class _TimedEvent(Protocol):
+    """Anything with a receive time that can be coalesced by path."""
+    path: str
+
+    @property
+    def received(self) -> float:
+        """Monotonic time at which the event was received."""
+        ...
+
+
+def get_event_type(event: events.FileSystemEvent) -> Optional[EventType]:
+    """The watcher's type for a watchdog event, or None if it is not reported."""
+    return _EVENT_TYPE_MAP.get(event.event_type)
+
+
+def compile_ignore_prefixes(prefixes: Iterable[str]) -> Optional[re.Pattern]:
+    """
+    Fold path prefixes into one anchored alternation, so a path is checked in a
+    single regex match however many prefixes there are. None if there are none.
+    """
+    prefixes = list(prefixes)
+    if not prefixes:
+        return None
+    return re.compile('|'.join(re.escape(p) for p in prefixes))
+
+
+def _translate_segment(segment: str) -> str:
+    """
+    Translate one glob path segment to a regex. Like the segments of Path.match,
+    ``*``, ``?`` and ``[...]`` never match a ``/``.
+    """
+    out: list[str] = []
+    i, n = 0, len(segment)
+    while i < n:
+        c = segment[i]
+        i += 1
+        if c == '*':
+            out.append('[^/]*')
+        elif c == '?':
+            out.append('[^/]')
+        elif c == '[':
+            j = i
+            if j < n and segment[j] == '!':
+                j += 1
+            if j < n and segment[j] == ']':
+                j += 1
+            j = segment.find(']', j)
+            if j < 0:
+                out.append(re.escape(c))
+                continue
+            # Escaped like fnmatch does, so nothing reads as a nested set or set operation
+            chars = re.sub(r'([\\\[\]&~|])', r'\\\1', segment[i:j])
+            i = j + 1
+            if chars.startswith('!'):
+                out.append('[^/' + chars[1:] + ']')
+            else:
+                out.append('[' + ('\\' + chars if chars.startswith('^') else chars) + ']')
+        else:
+            out.append(re.escape(c))
+    return ''.join(out)
+
+
+def _translate_glob(pattern: str) -> Optional[str]:
+    """
+    Translate a glob to a regex with the semantics of Path.match: a relative
+    pattern matches the last segments of the path, an absolute one the whole path.
+
+    None if it has a character class that is not valid, such as the reversed
+    range ``[z-a]``; callers then take the pattern literally.
+    """
+    segments = [_translate_segment(s) for s in pattern.split('/') if s not in ('', '.')]
+    body = '/'.join(segments)
+    if pattern.startswith('/'):
+        regex = '(?s:/' + body + r')\Z'
+    else:
+        regex = '(?s:(?:.*/)?' + body + r')\Z'
+    try:
+        re.compile(regex)
+    except re.error:
+        return None
+    return regex
+
+
+def _is_glob(pattern: str) -> bool:
+    """Whether a pattern is a glob; only ``*`` and ``?`` make it one."""
+    return '*' in pattern or '?' in pattern
+
+
+def compile_ignore_patterns(patterns: Iterable[str]) -> Optional[re.Pattern]:
+    """
+    Compile ignore patterns into one regex, matched with ``.match``, that decides
+    for all of them at once. None if there are no patterns.
+
+    Patterns with ``*`` or ``?`` are globs, matched like Path.match segment by
+    segment from the end of the path; everything else, ``[`` included, is a
+    plain suffix of the path, as is a glob whose brackets are not a valid class.
+    All the suffixes share a single alternation, so the path is scanned once
+    for them.
+    """
+    suffixes: list[str] = []
+    parts: list[str] = []
+    for pattern in patterns:
+        glob = _translate_glob(pattern) if _is_glob(pattern) else None
+        if glob is not None:
+            parts.append(glob)
+        else:
+            suffixes.append(re.escape(pattern))
+    if suffixes:
+        parts.append(r'(?s:.*)(?:' + '|'.join(suffixes) + r')\Z')
+    if not parts:
+        return None
+    return re.compile('|'.join(parts))
+
+
+def compile_prune_patterns(patterns: Iterable[str]) -> Optional[re.Pattern]:
+    """
+    Compile the ignore patterns that name whole directories, matched with
+    ``.match`` against a directory path. None if there are no patterns.
+
+    Unlike ``compile_ignore_patterns``, a plain pattern only matches at a
+    segment boundary: "env" prunes ``/r/env`` but not ``/r/myenv``, whose
+    files are still reported.
+    """
+    parts: list[str] = []
+    for pattern in patterns:
+        glob = _translate_glob(pattern) if _is_glob(pattern) else None
+        if glob is not None:
+            parts.append(glob)
+        else:
+            parts.append(r'(?s:.*/)' + re.escape(pattern.lstrip('/')) + r'\Z')
+    if not parts:
+        return None
+    return re.compile('|'.join(parts))
+
+
+def is_coalesced(pending: dict[str, _TimedEvent], path: str, received: float, window: float) -> bool:
+    """Whether an event for path received at ``received`` would be dropped by ``coalesce``."""
+    existing = pending.get(path)
+    return existing is not None and received - existing.received < window
+
+
+def coalesce(pending: dict[str, _TimedEvent], event: _TimedEvent, window: float) -> bool:
+    """
+    Record an event in the pending dict, keyed by path.
+
+    An event arriving less than ``window`` seconds after the one already pending
+    for its path is dropped; otherwise it replaces it. A window of 0 keeps the
+    latest event for every path.
+
+    Returns:
+        bool: True if the event was recorded.
+    """
+    if is_coalesced(pending, event.path, event.received, window):
+        return False
+
+    pending[event.path] = event
+    return True
@@ -1,13 +1,18 @@
+import os
 import logging
+import time
 import asyncio
 import pathlib
-import time
-from enum import Enum, auto
+from collections import deque
 from typing import Optional, AsyncGenerator, Callable
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 
 from watchdog import observers, events
 
+from ._core import (EventType, get_event_type, compile_ignore_patterns, compile_prune_patterns,
+                    coalesce, is_coalesced)
+from .inotify import INOTIFY_AVAILABLE, InotifyObserver
+
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
@@ -16,22 +21,10 @@ logger = logging.getLogger(__name__)
 
 
 DEFAULT_EVENT_BUFFER_SIZE = 1000
+IGNORE_CACHE_SIZE = 4096
 
 
-class EventType(Enum):
-    """
-    Event types for the watcher.
-    """
-    FILE_CREATED = auto()
-    FILE_MODIFIED = auto()
-    FILE_DELETED = auto()
-    FILE_MOVED = auto()
-
-    def __str__(self):
-        return self.name.replace('_', ' ').lower().title()
-
-
-@dataclass
+@dataclass(slots=True, frozen=True)
 class FileEvent:
     """
     Represents a file system event with detailed metadata.
@@ -39,27 +32,54 @@ class FileEvent:
     Attributes:
         event_type: Type of the file system event
         path: Path to the affected file
-        mod_time: Timestamp of the event
+        mod_time: Wall-clock time (``time.time()``) at which the event was received
         is_dir: Whether the event concerns a directory
-        size: Size of the file (if applicable)
         old_path: Previous path (for move events)
+        size: Size of the file (if applicable), read when accessed
     """
     event_type: EventType
     path: str
     mod_time: float
     is_dir: bool
-    size: Optional[int] = None
     old_path: Optional[str] = None
+    # Event loop time at which the event was received; the coalesce window is
+    # measured with it, as the wall clock can jump
+    _received: float = field(default=0.0, repr=False, compare=False)
+
+    @property
+    def received(self) -> float:
+        """Event loop time (monotonic) at which the event was received."""
+        return self._received
+
+    @property
+    def size(self) -> Optional[int]:
+        """
+        Size of the file in bytes, or None for directories, deleted or unreadable files.
+
+        Looked up on access rather than when the event arrives, so events nobody
+        asks the size of never cost a stat call on the event loop.
+        """
+        if self.is_dir or self.event_type == EventType.FILE_DELETED:
+            return None
+        try:
+            return os.stat(self.path).st_size
+        except OSError:
+            return None
 
 
 class AsyncEventHandler(events.FileSystemEventHandler):
     """
     An asynchronous event handler for file system events.
+
+    Raw events are appended to a deque by the observer thread and handed to the
+    callback on the event loop in batches, so a burst of events costs one loop
+    wakeup rather than one task per event.
     """
 
     def __init__(self, callback: Callable[[events.FileSystemEvent], None], loop: asyncio.AbstractEventLoop):
         self.callback = callback
         self.loop = loop
+        self._raw: deque[events.FileSystemEvent] = deque()
         super().__init__()
 
     def on_any_event(self, event: events.FileSystemEvent) -> None:
@@ -67,16 +87,17 @@ class AsyncEventHandler(events.FileSystemEventHandler):
         Handle any file system event.
         Note: This runs in a different thread, so we need to use call_soon_threadsafe
         """
-        self.loop.call_soon_threadsafe(self._create_task, event)
+        self._raw.append(event)
+        # Only the event that makes the deque non-empty schedules a drain; later
+        # ones are picked up by that drain, which runs until the deque is empty.
+        if len(self._raw) == 1:
+            self.loop.call_soon_threadsafe(self._drain)
 
-    def _create_task(self, event: events.FileSystemEvent) -> None:
-        """Create a task in the main event loop"""
-        task = self.loop.create_task(self.callback(event))
-        if hasattr(self.callback, '__self__'):
-            watcher = self.callback.__self__
-            if isinstance(watcher, AsyncFileWatcher):
-                watcher.pending_tasks.add(task)
-                task.add_done_callback(watcher.pending_tasks.discard)
+    def _drain(self) -> None:
+        """Pass every queued event to the callback, on the event loop thread."""
+        raw = self._raw
+        while raw:
+            self.callback(raw.popleft())
 
 
 class EventBuffer:
@@ -85,45 +106,65 @@ class EventBuffer:
 
     This class helps prevent event flooding by coalescing similar events
     that occur within a short time window.
+
+    All methods run on the event loop thread and never await, so no lock is
+    needed around the event dict.
     """
 
     def __init__(self, coalesce_window: float = 0.1) -> None:
         self.events: dict[str, FileEvent] = {}
         self.coalesce_window = coalesce_window
-        self._lock = asyncio.Lock()
-        self.last_flush_time = time.time()
-
-    async def add_event(self, event: FileEvent) -> None:
+        # Event loop time at which the oldest pending event arrived; the window
+        # is measured from it, so a flush after an idle period is still delayed
+        self.first_event_time: Optional[float] = None
+        # Set while events are waiting to be flushed, so the consumer can sleep
+        # until there is work instead of polling
+        self.has_events = asyncio.Event()
+
+    def add_event(self, event: FileEvent) -> None:
         """
         Add an event to the buffer, potentially coalescing with existing events.
 
+        The event's receive time is taken as the current time, so no clock is read.
+
         Parameters:
             event (FileEvent): The event to add to the buffer.
         """
-        async with self._lock:
-            key = event.path
-            curr_time = time.time()
+        if coalesce(self.events, event, self.coalesce_window):
+            if self.first_event_time is None:
+                self.first_event_time = event.received
+            self.has_events.set()
 
-            if key in self.events:
-                existing_event = self.events[key]
-                if curr_time - existing_event.mod_time < self.coalesce_window:
-                    return
+    def is_coalesced(self, path: str, curr_time: float) -> bool:
+        """
+        Whether an event for the path arriving now would be dropped by ``add_event``.
 
-            self.events[key] = event
+        Lets the watcher skip building events that would be thrown away.
+        """
+        return is_coalesced(self.events, path, curr_time, self.coalesce_window)
 
-    async def get_pending_events(self) -> list[FileEvent]:
+    def get_pending_events(self, curr_time: float) -> list[FileEvent]:
         """
-        Retrieve and clear pending events if the coalesce window has elapsed.
+        Retrieve and clear pending events once the coalesce window has elapsed
+        since the first of them arrived.
+
+        Parameters:
+            curr_time (float): The current event loop time.
         """
-        async with self._lock:
-            curr_time = time.time()
-            if curr_time - self.last_flush_time < self.coalesce_window:
-                return []
+        first = self.first_event_time
+        if first is not None and curr_time - first < self.coalesce_window:
+            return []
 
-            events = list(self.events.values())
-            self.events.clear()
-            self.last_flush_time = curr_time
-            return events
+        pending, self.events = self.events, {}
+        self.has_events.clear()
+        self.first_event_time = None
+        return list(pending.values())
+
+    def remaining(self, curr_time: float) -> float:
+        """Seconds until the pending events are due to be flushed; 0 if they are."""
+        if self.first_event_time is None:
+            return 0.0
+        return max(self.coalesce_window - (curr_time - self.first_event_time), 0.0)
 
 
 class AsyncFileWatcher:
@@ -134,15 +175,37 @@ class AsyncFileWatcher:
     that can be processed without blocking.
     """
 
-    def __init__(self, root_path: str, ignored_patterns: Optional[list[str]] = None, coalesce_window: float = 0.1) -> None:
+    def __init__(self, root_path: str, ignored_patterns: Optional[list[str]] = None, coalesce_window: float = 0.1,
+                 use_inotify: bool = True) -> None:
+        """
+        Initialize the watcher.
+
+        On Linux with the optional ``asyncinotify`` package installed, events are
+        read from inotify on the event loop itself; otherwise (or with
+        ``use_inotify=False``) watchdog's observer thread is used.
+        """
         self.root_path = pathlib.Path(root_path).resolve()
+        # Resolved once; every later use takes this string instead of the Path
+        self._root_str = str(self.root_path)
         self.ignored_patterns = set(ignored_patterns or [])
-
-        self.event_queue = asyncio.Queue(maxsize=DEFAULT_EVENT_BUFFER_SIZE)
+        self._ignore_re = compile_ignore_patterns(self.ignored_patterns)
+        # Directories are only skipped when a pattern names the whole directory
+        self._prune_re = compile_prune_patterns(self.ignored_patterns)
+        # Editors and build tools touch the same paths over and over, so ignore
+        # decisions are remembered; the oldest entry is evicted when it is full.
+        self._ignore_cache: dict[str, bool] = {}
+
+        # Single producer (__process_buffer), single consumer (get_event), both on
+        # the event loop, so a deque plus a wakeup event is all the queue needs
+        self.event_queue: deque[FileEvent] = deque()
+        self._events_ready = asyncio.Event()
         self.event_buffer = EventBuffer(coalesce_window)
         self.observer = observers.Observer()
+        self.inotify_observer: Optional[InotifyObserver] = None
+        if use_inotify and INOTIFY_AVAILABLE:
+            self.inotify_observer = InotifyObserver(
+                self._root_str, self.__handle_event, self.__should_prune)
         self.is_running = False
-        self.pending_tasks: set[asyncio.Task] = set()
 
     def __should_ignore(self, file_path: str) -> bool:
         """
@@ -154,48 +217,103 @@ class AsyncFileWatcher:
         Returns:
             bool: True if the path should be ignored, False otherwise.
         """
-        path = pathlib.Path(file_path).resolve()
-        for pattern in self.ignored_patterns:
-            if '*' in pattern or '?' in pattern:
-                if path.match(pattern):
-                    return True
-            else:
-                if str(path).endswith(pattern):
-                    return True
+        path = os.fspath(file_path)
+        ignored = self._ignore_cache.get(path)
+        if ignored is None:
+            ignored = ((self._ignore_re is not None and self._ignore_re.match(path) is not None)
+                       or self.__in_pruned_tree(path))
+            if len(self._ignore_cache) >= IGNORE_CACHE_SIZE:
+                del self._ignore_cache[next(iter(self._ignore_cache))]
+            self._ignore_cache[path] = ignored
+        return ignored
+
+    def __should_prune(self, dir_path: str) -> bool:
+        """
+        Check if a directory is skipped along with everything below it.
+
+        Only patterns that match the whole directory name prune it. Touches no
+        shared state, so it is safe to call from the threads that walk the tree.
+        """
+        return self._prune_re is not None and self._prune_re.match(os.fspath(dir_path)) is not None
+
+    def __in_pruned_tree(self, path: str) -> bool:
+        """
+        Check if the path lies below a pruned directory, at any depth under the root.
+
+        The inotify backend never watches pruned directories; with watchdog the
+        whole tree is watched, so their events are dropped here instead.
+        """
+        if self._prune_re is None:
+            return False
+        root_len = len(self._root_str)
+        parent = os.path.dirname(path)
+        while len(parent) > root_len:
+            if self._prune_re.match(parent) is not None:
+                return True
+            parent = os.path.dirname(parent)
         return False
 
-    async def __handle_event(self, event: events.FileSystemEvent) -> None:
+    def __handle_event(self, event: events.FileSystemEvent) -> None:
         """
         Handle a file system event. and add it to the event buffer.
         """
-        logger.debug(f"Received raw event: {event}")
+        logger.debug("Received raw event: %r", event)
         try:
+            # Directory events are not reported, as before
+            if event.is_directory:
+                return
+
             if self.__should_ignore(event.src_path):
-                print(f"Ignored {event.src_path}")
+                logger.debug("Ignored %s", event.src_path)
                 return
 
-            event_type = self.__get_event_type(event)
-            logger.debug(f"Mapped event type: {event_type}")
-            size = None
-            if event_type != EventType.FILE_DELETED and not event.is_directory:
-                try:
-                    size = pathlib.Path(event.src_path).stat().st_size
-                except OSError:
-                    pass
-            if event_type is not None:
+            event_type = get_event_type(event)
+            logger.debug("Mapped event type: %s", event_type)
+            if event_type is EventType.FILE_DELETED:
+                self.__queue_deletion(event.src_path)
+            elif event_type is not None:
+                now = asyncio.get_running_loop().time()
+                # In an event storm most events land inside the coalesce window;
+                # those are dropped before a FileEvent is allocated for them
+                if self.event_buffer.is_coalesced(event.src_path, now):
+                    return
+
                 file_event = FileEvent(
                     event_type=event_type,
                     path=event.src_path,
                     mod_time=time.time(),
                     is_dir=event.is_directory,
-                    size=size,
-                    old_path=str(event.dest_path) if event.dest_path else None
+                    old_path=str(event.dest_path) if event.dest_path else None,
+                    _received=now,
                 )
-                await self.event_buffer.add_event(file_event)
+                self.event_buffer.add_event(file_event)
 
         except Exception as e:
             logger.error(f"Error handling event: {e}")
-            logger.debug(f"Event details: {event.__dict__}")
+            logger.debug("Event details: src=%s dest=%s is_dir=%s",
+                         event.src_path, getattr(event, 'dest_path', None), event.is_directory)
+
+    def __queue_deletion(self, path: str) -> None:
+        """
+        Queue a deletion straight away, bypassing the event buffer.
+
+        Nothing can be coalesced into a deletion, so it is not delayed by the
+        coalesce window. An event still buffered for the path is dropped: the
+        file is gone, and reporting it afterwards would undo the deletion.
+        """
+        self.event_buffer.events.pop(path, None)
+        if len(self.event_queue) >= DEFAULT_EVENT_BUFFER_SIZE:
+            logger.warning("Event queue is full, skipping deletion of %s.", path)
+            return
+
+        self.event_queue.append(FileEvent(
+            event_type=EventType.FILE_DELETED,
+            path=path,
+            mod_time=time.time(),
+            is_dir=False,
+            _received=asyncio.get_running_loop().time(),
+        ))
+        self._events_ready.set()
 
     async def watch(self) -> None:
         """
@@ -205,22 +323,21 @@ class AsyncFileWatcher:
         if self.is_running:
             raise RuntimeError("File watcher is already running")
 
-        logger.info(f"Watching {pathlib.Path(
-            self.root_path).resolve()} for changes...")
+        logger.info("Watching %s for changes...", self._root_str)
         self.is_running = True
 
         try:
 
-            event_handler = AsyncEventHandler(
-                callback=self.__handle_event,
-                loop=asyncio.get_running_loop())
-            self.observer.schedule(
-                event_handler=event_handler,
-                path=str(self.root_path),
-                recursive=True
-            )
-
-            self.observer.start()
+            if self.inotify_observer is not None:
+                await self.inotify_observer.start()
+            else:
+                event_handler = AsyncEventHandler(
+                    callback=self.__handle_event,
+                    loop=asyncio.get_running_loop())
+                # One recursive watch, so watchdog can pair moves anywhere in the tree
+                self.observer.schedule(event_handler, self._root_str, recursive=True)
+                # Starting adds a watch for every directory, so keep it off the loop
+                await asyncio.to_thread(self.observer.start)
             await asyncio.create_task(self.__process_buffer())
 
             logger.info("Watcher running successfully")
@@ -234,12 +351,15 @@ class AsyncFileWatcher:
         """
         Get events from the event buffer.
         """
+        queue = self.event_queue
         while self.is_running:
 
             try:
-                event = await self.event_queue.get()
-                yield event
-                self.event_queue.task_done()
+                await self._events_ready.wait()
+                while queue:
+                    yield queue.popleft()
+                # Nothing can be queued between the emptiness check and here
+                self._events_ready.clear()
 
             except asyncio.CancelledError:
                 break
@@ -257,52 +377,57 @@ class AsyncFileWatcher:
 
         try:
             # First stop getting new events
-            self.observer.stop()
-            self.observer.join()
-
-            for task in self.pending_tasks:
-                task.cancel()
-
-            if self.pending_tasks:
-                await asyncio.gather(*self.pending_tasks, return_exceptions=True)
-            await self.event_queue.join()
+            if self.inotify_observer is not None:
+                await self.inotify_observer.stop()
+            else:
+                self.observer.stop()
+                self.observer.join()
+            # Wake the buffer processor and the consumer so they see is_running
+            # is False; the consumer still drains what is already queued
+            self.event_buffer.has_events.set()
+            self._events_ready.set()
 
             logger.info("File watcher stopped.")
         except Exception as e:
             logger.error(f"Error stopping file watcher: {e}")
             raise
         finally:
-            self.pending_tasks.clear()
+            self._ignore_cache.clear()
 
     async def __process_buffer(self) -> None:
         """
         Continuously process the event buffer and send events to the queue.
+
+        Sleeps until the buffer receives an event, then waits out the rest of
+        the coalesce window before flushing, so an idle watcher never wakes up.
         """
+        buffer = self.event_buffer
+        loop = asyncio.get_running_loop()
         while self.is_running:
 
             try:
-                events = await self.event_buffer.get_pending_events()
-                for event in events:
-                    try:
-                        await self.event_queue.put(event)
-                    except asyncio.QueueFull:
-                        logger.warning("Event queue is full, skipping event.")
+                await buffer.has_events.wait()
+                if not self.is_running:
+                    break
+
+                remaining = buffer.remaining(loop.time())
+                if remaining > 0:
+                    await asyncio.sleep(remaining)
+
+                events = buffer.get_pending_events(loop.time())
+                room = max(DEFAULT_EVENT_BUFFER_SIZE - len(self.event_queue), 0)
+                if len(events) > room:
+                    logger.warning("Event queue is full, skipping %d events.", len(events) - room)
+                    events = events[:room]
+
+                # One extend and one wakeup for the whole flush
+                if events:
+                    self.event_queue.extend(events)
+                    self._events_ready.set()
 
             except Exception as e:
                 logger.error(f"Error processing events: {e}")
 
-            await asyncio.sleep(0.01)  # Sleep to avoid busy-waiting
-
-    def __get_event_type(self, event: events.FileSystemEvent) -> EventType | None:
-        """Get the event type from the event."""
-        event_type_map = {
-            events.FileCreatedEvent: EventType.FILE_CREATED,
-            events.FileModifiedEvent: EventType.FILE_MODIFIED,
-            events.FileDeletedEvent: EventType.FILE_DELETED,
-            events.FileMovedEvent: EventType.FILE_MOVED
-        }
-        return event_type_map.get(type(event))
-
 
 async def start_watching(wather: AsyncFileWatcher, on_event: Callable[[FileEvent], None]) -> None:
     """Start watching for file changes and call the callback on each event."""
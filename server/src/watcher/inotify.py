@@ -0,0 +1,204 @@
+import os
+import sys
+import asyncio
+import logging
+from pathlib import Path
+from typing import Callable, Optional
+
+from watchdog import events
+
+try:
+    from asyncinotify import Inotify, Mask, Watch
+except ImportError:  # optional; AsyncFileWatcher falls back to watchdog without it
+    Inotify = Mask = Watch = None
+
+logger = logging.getLogger(__name__)
+
+
+INOTIFY_AVAILABLE = sys.platform.startswith('linux') and Inotify is not None
+
+# Seconds to wait for the MOVED_TO half of a rename before treating the
+# MOVED_FROM as a file leaving the tree
+MOVE_PAIR_TIMEOUT = 0.5
+
+
+class InotifyObserver:
+    """
+    Watches a directory tree with inotify, reading events on the event loop.
+
+    A drop-in for watchdog's observer thread on Linux: events are read straight
+    from the inotify file descriptor by a task, so they never cross a thread.
+    inotify is not recursive, so every directory gets its own watch, added as
+    directories appear and dropped as they go. Events are handed to the callback
+    as watchdog file events; directory events only maintain the watches.
+    """
+
+    def __init__(self, root_path: str,
+                 callback: Callable[[events.FileSystemEvent], None],
+                 should_ignore: Callable[[str], bool]) -> None:
+        """
+        Initialize the observer.
+
+        Parameters:
+            root_path (str): The directory tree to watch.
+            callback (Callable): Called on the event loop with each file event.
+            should_ignore (Callable): Directories below the root it returns True for
+                are not watched. The root itself is always watched.
+        """
+        self.root_path = root_path
+        self.callback = callback
+        self.should_ignore = should_ignore
+
+        self._inotify: Optional[Inotify] = None
+        self._reader: Optional[asyncio.Task] = None
+        self._watches: dict[str, Watch] = {}
+        # cookie -> (source path, is_dir, timer reporting it as moved out)
+        self._pending_moves: dict[int, tuple[str, bool, asyncio.TimerHandle]] = {}
+
+    async def start(self) -> None:
+        """Watch the tree and start reading events."""
+        self._inotify = Inotify()
+        # The initial walk can be long on big trees, so keep it off the loop
+        watches, _ = await asyncio.to_thread(self.__watch_tree, self.root_path)
+        self._watches.update(watches)
+        self._reader = asyncio.create_task(self.__read_events())
+
+    async def stop(self) -> None:
+        """Stop reading events and release the inotify descriptor."""
+        if self._reader is not None:
+            self._reader.cancel()
+            await asyncio.gather(self._reader, return_exceptions=True)
+            self._reader = None
+
+        for _, _, timer in self._pending_moves.values():
+            timer.cancel()
+        self._pending_moves.clear()
+        self._watches.clear()
+
+        if self._inotify is not None:
+            self._inotify.close()
+            self._inotify = None
+
+    async def __read_events(self) -> None:
+        """Dispatch inotify events until cancelled."""
+        loop = asyncio.get_running_loop()
+        async for event in self._inotify:
+            try:
+                await self.__dispatch(event, loop)
+            except Exception as e:
+                logger.error("Error handling inotify event %r: %s", event, e)
+
+    async def __dispatch(self, event, loop: asyncio.AbstractEventLoop) -> None:
+        """Translate one inotify event into watch updates and file events."""
+        mask = event.mask
+        if mask & Mask.Q_OVERFLOW:
+            logger.warning("inotify event queue overflowed; some changes were missed")
+            return
+        if mask & Mask.IGNORED or event.path is None:
+            return
+
+        path = str(event.path)
+        is_dir = bool(mask & Mask.ISDIR)
+
+        if mask & Mask.MOVED_FROM:
+            timer = loop.call_later(MOVE_PAIR_TIMEOUT, self.__moved_out, event.cookie)
+            self._pending_moves[event.cookie] = (path, is_dir, timer)
+            return
+
+        if mask & Mask.MOVED_TO:
+            moved = self._pending_moves.pop(event.cookie, None)
+            if moved is not None:
+                src_path, _, timer = moved
+                timer.cancel()
+                if is_dir:
+                    self.__rename_tree(src_path, path)
+                else:
+                    self.callback(events.FileMovedEvent(src_path, path))
+                return
+
+        if is_dir:
+            if mask & (Mask.CREATE | Mask.MOVED_TO):
+                if not self.should_ignore(path):
+                    await self.__watch_new_tree(path)
+            elif mask & Mask.DELETE:
+                self.__forget_tree(path)
+            return
+
+        if mask & (Mask.CREATE | Mask.MOVED_TO):
+            self.callback(events.FileCreatedEvent(path))
+        elif mask & Mask.MODIFY:
+            self.callback(events.FileModifiedEvent(path))
+        elif mask & Mask.DELETE:
+            self.callback(events.FileDeletedEvent(path))
+
+    def __moved_out(self, cookie: int) -> None:
+        """A MOVED_FROM was never paired: the path left the watched tree."""
+        moved = self._pending_moves.pop(cookie, None)
+        if moved is None:
+            return
+
+        src_path, is_dir, _ = moved
+        if is_dir:
+            self.__forget_tree(src_path, remove=True)
+        else:
+            self.callback(events.FileDeletedEvent(src_path))
+
+    async def __watch_new_tree(self, root: str) -> None:
+        """
+        Watch a directory that appeared in the tree and report the files already in it.
+
+        A moved-in tree can be large, so it is walked in a worker thread. Events
+        are not read meanwhile; they wait in the inotify queue, in order.
+        """
+        # Files created before the new watch was added are reported by the walk
+        watches, files = await asyncio.to_thread(self.__watch_tree, root, True)
+        self._watches.update(watches)
+        for path in files:
+            self.callback(events.FileCreatedEvent(path))
+
+    def __watch_tree(self, root: str, report_files: bool = False) -> tuple[dict[str, Watch], list[str]]:
+        """
+        Add a watch for root and every directory below it that is not ignored.
+        Root itself is not checked; callers decide whether it is watched.
+
+        Runs in a worker thread, so it touches neither the watch dict nor the
+        callback: the new watches, and the files found if ``report_files`` is
+        set, are returned for the event loop to record and report.
+        """
+        watches: dict[str, Watch] = {}
+        files: list[str] = []
+        for dirpath, dirnames, filenames in os.walk(root):
+            try:
+                watches[dirpath] = self._inotify.add_watch(
+                    dirpath,
+                    Mask.CREATE | Mask.MODIFY | Mask.DELETE | Mask.MOVED_FROM | Mask.MOVED_TO)
+            except OSError:
+                # Removed or unreadable before we got to it
+                dirnames.clear()
+                continue
+
+            dirnames[:] = [name for name in dirnames
+                           if not self.should_ignore(os.path.join(dirpath, name))]
+            if report_files:
+                files.extend(os.path.join(dirpath, name) for name in filenames)
+        return watches, files
+
+    def __forget_tree(self, root: str, remove: bool = False) -> None:
+        """Drop the watches of root and its subdirectories, removing them from inotify if asked."""
+        prefix = root + os.sep
+        for path in [p for p in self._watches if p == root or p.startswith(prefix)]:
+            watch = self._watches.pop(path)
+            if remove:
+                try:
+                    self._inotify.rm_watch(watch)
+                except OSError:
+                    pass
+
+    def __rename_tree(self, old_root: str, new_root: str) -> None:
+        """Relabel the watches of a moved directory; inotify watches follow the inode."""
+        prefix = old_root + os.sep
+        for path in [p for p in self._watches if p == old_root or p.startswith(prefix)]:
+            watch = self._watches.pop(path)
+            new_path = new_root + path[len(old_root):]
+            watch.path = Path(new_path)
+            self._watches[new_path] = watch
@@ -1,38 +1,36 @@
 import time
-from typing import Callable, Optional, Generator
-from enum import Enum, auto
+import logging
+from typing import Callable, Optional, Generator, NamedTuple
 import queue
-from threading import Timer
+import threading
 
 
 from watchdog import events, observers
 
+from ._core import EventType, get_event_type, compile_ignore_prefixes, coalesce
+
+logger = logging.getLogger(__name__)
 # Constants that define the watcher's behavior
 DEFAULT_EVENT_BUFFER_SIZE = 100
 DEFAULT_FLUSH_INTERVAL = 0.1  # 100ms in seconds
 
 
-class EventType(Enum):
-    """
-    Event types for the watcher.
+class FileEvent(NamedTuple):
     """
-    FILE_CREATED = auto()
-    FILE_MODIFIED = auto()
-    FILE_DELETED = auto()
-    FILE_MOVED = auto()
-
-    def __str__(self):
-        return self.name.replace('_', ' ').title()
+    Represents a file system event with additional metadata.
 
+    ``dest_path`` is where the file went, for FILE_MOVED events; None otherwise.
+    """
+    type: EventType
+    path: str
+    mod_time: float
+    is_dir: bool
+    dest_path: Optional[str] = None
 
-class FileEvent:
-    """Represents a file system event with additional metadata."""
-
-    def __init__(self, event_type: EventType, path: str, mod_time: float, is_dir: bool):
-        self.type = event_type
-        self.path = path
-        self.mod_time = mod_time
-        self.is_dir = is_dir
+    @property
+    def received(self) -> float:
+        """When the event was received, for coalescing; the wall-clock ``mod_time``."""
+        return self.mod_time
 
 
 class EventHandler(events.FileSystemEventHandler):
@@ -52,23 +50,25 @@ class FileWatcher:
     Implements debouncing to prevent event flooding and coalesces rapid sequences of events.
     """
 
-    event_map = {
-        'created': EventType.FILE_CREATED,
-        'modified': EventType.FILE_MODIFIED,
-        'deleted': EventType.FILE_DELETED,
-    }
-
     def __init__(self, root_path: str, ignore_paths: Optional[list[str]] = None):
         self.root_path = root_path
         self.event_queue = queue.Queue(maxsize=DEFAULT_EVENT_BUFFER_SIZE)
         self.observer = observers.Observer()
         self.ignore_paths: set[str] = set()
         self.pending_events: dict[str, FileEvent] = {}
-        self.flush_timer: Optional[Timer] = None
+        # Guards pending_events; the flusher waits on it for events to arrive
+        self._cv = threading.Condition()
+        self._closed = False
 
         if ignore_paths:
             self.ignore_paths = set(ignore_paths)
 
+        self._ignore_re = compile_ignore_prefixes(self.ignore_paths)
+
+        # One long-lived thread flushes pending events, instead of a Timer per event
+        self._flusher = threading.Thread(target=self._flush_loop, daemon=True)
+        self._flusher.start()
+
         # Start watching the directory tree
         event_handler = EventHandler(self._handle_event)
         self.observer.schedule(event_handler, root_path, recursive=True)
@@ -76,7 +76,7 @@ class FileWatcher:
 
     def _should_ignore(self, path: str) -> bool:
         """Check if the given path should be ignored."""
-        return any(path.startswith(ignore) for ignore in self.ignore_paths)
+        return self._ignore_re is not None and self._ignore_re.match(path) is not None
 
     def _handle_event(self, event: events.FileSystemEvent):
         """
@@ -85,37 +85,62 @@ class FileWatcher:
         if self._should_ignore(event.src_path):
             return
 
-        if event.event_type not in self.event_map:
+        event_type = get_event_type(event)
+        if event_type is None:
             return  # Ignore other event types
 
-        event_type = self.event_map[event.event_type]
-
         file_event = FileEvent(
-            event_type=event_type,
+            type=event_type,
             path=event.src_path,
             mod_time=time.time(),
             is_dir=event.is_directory,
+            dest_path=str(event.dest_path) if event.dest_path else None,
         )
 
-        print(file_event.type)
+        with self._cv:
+            was_empty = not self.pending_events
+            # A window of 0: the latest event for a path wins until the next flush
+            coalesce(self.pending_events, file_event, 0.0)
+            # The flusher only needs waking for the first event of a burst
+            if was_empty:
+                self._cv.notify()
 
-        self.pending_events[event.src_path] = file_event
-
-        if self.flush_timer:
-            self.flush_timer.cancel()
+    def _flush_loop(self):
+        """
+        Flush pending events until the watcher is closed.
 
-        self.flush_timer = Timer(DEFAULT_FLUSH_INTERVAL, self._flush_events)
-        self.flush_timer.start()
+        Once an event arrives, events are gathered for DEFAULT_FLUSH_INTERVAL and
+        then flushed together. The interval is not restarted by later events, so
+        a file that is modified continuously is still reported every interval.
+        Events still pending when the watcher is closed are flushed right away.
+        """
+        while True:
+            with self._cv:
+                self._cv.wait_for(lambda: self.pending_events or self._closed)
+                closed = self._cv.wait_for(lambda: self._closed, timeout=DEFAULT_FLUSH_INTERVAL)
+                pending, self.pending_events = self.pending_events, {}
+            self._flush_events(pending)
+            if closed:
+                return
+
+    def _flush_events(self, pending: dict[str, FileEvent]):
+        """
+        Flush the given pending events to the event queue.
 
-    def _flush_events(self):
-        """Flush all pending events to the event queue."""
-        for event in self.pending_events.values():
-            try:
-                self.event_queue.put(event)
-            except queue.Full:
-                break
-        self.pending_events.clear()
-        self.flush_timer = None
+        Waits for room while the queue is full, so no event is lost to a slow
+        consumer; only once the watcher is closed are the remaining events dropped.
+        """
+        events = list(pending.values())
+        for i, event in enumerate(events):
+            while True:
+                try:
+                    self.event_queue.put(event, timeout=DEFAULT_FLUSH_INTERVAL)
+                    break
+                except queue.Full:
+                    if self._closed:
+                        logger.warning("Event queue is full, dropping %d events on close.",
+                                       len(events) - i)
+                        return
 
     def events(self) -> Generator[FileEvent, None, None]:
         """Generator that yields file events as they occur."""
@@ -127,10 +152,12 @@ class FileWatcher:
 
     def close(self):
         """Stop the watcher and release resources."""
-        if self.flush_timer:
-            self.flush_timer.cancel()
         self.observer.stop()
         self.observer.join()
+        with self._cv:
+            self._closed = True
+            self._cv.notify()
+        self._flusher.join()
 
 
 def start_watching(root_path: str, on_event: Callable[[FileEvent], None]) -> None:
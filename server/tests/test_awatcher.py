@@ -0,0 +1,258 @@
+import asyncio
+import os
+import time
+from pathlib import Path
+
+import pytest
+import pytest_asyncio
+
+from src.watcher import awatcher
+from src.watcher.awatcher import AsyncFileWatcher, EventBuffer, FileEvent
+from src.watcher._core import EventType
+from src.watcher.inotify import INOTIFY_AVAILABLE
+
+# Time for the backend to deliver events and the buffer to flush them
+SETTLE = 0.4
+
+
+@pytest.fixture(params=[
+    False,
+    pytest.param(True, marks=pytest.mark.skipif(
+        not INOTIFY_AVAILABLE, reason="inotify is not available")),
+], ids=["watchdog", "inotify"])
+def use_inotify(request):
+    return request.param
+
+
+@pytest_asyncio.fixture
+async def watched(tmp_path, use_inotify):
+    """
+    Start an AsyncFileWatcher on tmp_path/root and collect what it reports.
+
+    Returns a function that starts it, so tests can set up the tree first.
+    With ``consume=False`` nothing reads the watcher's events.
+    """
+    root = tmp_path / "root"
+    root.mkdir()
+    state = {}
+
+    async def start(consume=True, **kwargs):
+        watcher = AsyncFileWatcher(str(root), use_inotify=use_inotify, **kwargs)
+        received = []
+
+        async def consume_events():
+            async for event in watcher.get_event():
+                received.append(event)
+
+        state["watcher"] = watcher
+        state["task"] = asyncio.create_task(watcher.watch())
+        await asyncio.sleep(0.2)
+        if consume:
+            state["consumer"] = asyncio.create_task(consume_events())
+        return watcher, received
+
+    yield root, start
+
+    if "watcher" in state:
+        await state["watcher"].stop()
+        await asyncio.wait_for(state["task"], 3)
+        if "consumer" in state:
+            await asyncio.wait_for(state["consumer"], 3)
+
+
+def reported(received, root: Path):
+    return [(event.event_type, os.path.relpath(event.path, root)) for event in received]
+
+
+@pytest.mark.asyncio
+async def test_moves_across_directories_are_reported_as_moves(watched):
+    root, start = watched
+    (root / "a").mkdir()
+    (root / "b").mkdir()
+    (root / "top.py").write_text("x")
+    (root / "a" / "mod.py").write_text("x")
+    _, received = await start()
+
+    (root / "top.py").rename(root / "a" / "top.py")
+    (root / "a" / "mod.py").rename(root / "b" / "mod.py")
+    await asyncio.sleep(SETTLE)
+
+    moves = {(os.path.relpath(e.path, root), os.path.relpath(e.old_path, root))
+             for e in received if e.event_type is EventType.FILE_MOVED}
+    assert moves == {("top.py", "a/top.py"), ("a/mod.py", "b/mod.py")}
+    assert all(e.event_type is EventType.FILE_MOVED for e in received)
+
+
+@pytest.mark.asyncio
+async def test_pruned_directories_are_skipped_at_any_depth(watched):
+    root, start = watched
+    (root / "build").mkdir()
+    (root / "src" / "build").mkdir(parents=True)
+    _, received = await start(ignored_patterns=["build"])
+
+    (root / "build" / "a.py").write_text("x")
+    (root / "src" / "build" / "b.py").write_text("x")
+    (root / "rebuild.py").write_text("x")
+    (root / "src" / "rebuild").mkdir()
+    (root / "src" / "rebuild" / "c.py").write_text("x")
+    await asyncio.sleep(SETTLE)
+
+    assert {path for _, path in reported(received, root)} == {"rebuild.py", "src/rebuild/c.py"}
+
+
+@pytest.mark.asyncio
+async def test_window_is_measured_from_the_first_buffered_event():
+    buffer = EventBuffer(coalesce_window=0.1)
+    buffer.add_event(FileEvent(EventType.FILE_CREATED, "/r/a", 0.0, False, _received=100.0))
+
+    # However long the buffer was idle, the event waits out the window
+    assert buffer.get_pending_events(100.05) == []
+    assert buffer.remaining(100.05) == pytest.approx(0.05)
+    assert [e.path for e in buffer.get_pending_events(100.2)] == ["/r/a"]
+    assert buffer.remaining(100.2) == 0.0
+
+
+@pytest.mark.asyncio
+async def test_single_write_after_idle_is_one_event(watched):
+    root, start = watched
+    _, received = await start()
+    await asyncio.sleep(0.3)
+
+    with open(root / "a.py", "w") as f:
+        f.write("x")
+    await asyncio.sleep(SETTLE)
+
+    assert reported(received, root) == [(EventType.FILE_CREATED, "a.py")]
+
+
+@pytest.mark.asyncio
+async def test_mod_time_is_wall_clock_time(watched):
+    root, start = watched
+    _, received = await start()
+
+    before = time.time()
+    (root / "a.py").write_text("x")
+    await asyncio.sleep(SETTLE)
+
+    assert len(received) == 1
+    assert before <= received[0].mod_time <= time.time()
+    assert received[0].mod_time == pytest.approx(os.stat(root / "a.py").st_mtime, abs=1)
+
+
+@pytest.mark.asyncio
+async def test_ignored_files_are_not_reported(watched):
+    root, start = watched
+    watcher, received = await start(ignored_patterns=["*.pyc", ".env"])
+
+    (root / "a.pyc").write_text("x")
+    (root / ".env").write_text("x")
+    (root / "a.py").write_text("x")
+    await asyncio.sleep(SETTLE)
+
+    assert reported(received, root) == [(EventType.FILE_CREATED, "a.py")]
+    # Decisions are remembered per path
+    assert watcher._ignore_cache[str(root / "a.pyc")] is True
+    assert watcher._ignore_cache[str(root / "a.py")] is False
+
+
+def test_ignore_cache_evicts_the_oldest_entry(tmp_path, monkeypatch):
+    monkeypatch.setattr(awatcher, "IGNORE_CACHE_SIZE", 2)
+    watcher = AsyncFileWatcher(str(tmp_path), ignored_patterns=["*.pyc"], use_inotify=False)
+    should_ignore = watcher._AsyncFileWatcher__should_ignore
+
+    assert should_ignore("/r/a.pyc")
+    assert not should_ignore("/r/b.py")
+    assert not should_ignore("/r/c.py")
+
+    assert list(watcher._ignore_cache) == ["/r/b.py", "/r/c.py"]
+
+
+@pytest.mark.asyncio
+async def test_rapid_writes_to_a_file_are_coalesced(watched):
+    root, start = watched
+    _, received = await start()
+
+    for i in range(5):
+        (root / "a.py").write_text(f"content {i}")
+    await asyncio.sleep(SETTLE)
+
+    assert reported(received, root) == [(EventType.FILE_CREATED, "a.py")]
+
+
+@pytest.mark.asyncio
+async def test_deletion_does_not_wait_for_the_coalesce_window(watched):
+    root, start = watched
+    (root / "a.py").write_text("x")
+    _, received = await start(coalesce_window=5.0)
+
+    (root / "a.py").unlink()
+    await asyncio.sleep(0.2)
+
+    assert reported(received, root) == [(EventType.FILE_DELETED, "a.py")]
+
+
+@pytest.mark.asyncio
+async def test_deletion_drops_the_buffered_event_of_the_file(watched):
+    root, start = watched
+    _, received = await start(coalesce_window=0.3)
+
+    (root / "a.py").write_text("x")
+    await asyncio.sleep(0.05)
+    (root / "a.py").unlink()
+    await asyncio.sleep(SETTLE + 0.3)
+
+    assert reported(received, root) == [(EventType.FILE_DELETED, "a.py")]
+
+
+@pytest.mark.asyncio
+async def test_files_in_new_directories_are_reported(watched):
+    root, start = watched
+    _, received = await start()
+
+    (root / "new" / "sub").mkdir(parents=True)
+    await asyncio.sleep(0.1)
+    (root / "new" / "sub" / "a.py").write_text("x")
+    await asyncio.sleep(SETTLE)
+
+    assert reported(received, root) == [(EventType.FILE_CREATED, "new/sub/a.py")]
+
+
+@pytest.mark.asyncio
+async def test_burst_of_events_is_delivered_in_full(watched):
+    root, start = watched
+    _, received = await start()
+
+    for i in range(200):
+        (root / f"{i}.py").write_text("x")
+    await asyncio.sleep(SETTLE + 0.3)
+
+    assert {path for _, path in reported(received, root)} == {f"{i}.py" for i in range(200)}
+
+
+@pytest.mark.asyncio
+async def test_events_beyond_the_queue_size_are_dropped(watched, monkeypatch):
+    monkeypatch.setattr(awatcher, "DEFAULT_EVENT_BUFFER_SIZE", 3)
+    root, start = watched
+    # Nobody consumes, so the queue fills up
+    watcher, _ = await start(consume=False)
+
+    for i in range(5):
+        (root / f"{i}.py").write_text("x")
+    await asyncio.sleep(SETTLE)
+
+    assert len(watcher.event_queue) == 3
+
+
+@pytest.mark.asyncio
+async def test_get_event_drains_the_queue_and_ends_after_stop(watched):
+    root, start = watched
+    watcher, received = await start(coalesce_window=0.05)
+
+    (root / "a.py").write_text("x")
+    await asyncio.sleep(SETTLE)
+    await watcher.stop()
+    await asyncio.sleep(0.05)
+
+    assert reported(received, root) == [(EventType.FILE_CREATED, "a.py")]
+    assert [t for t in asyncio.all_tasks()
+            if getattr(t.get_coro(), "__name__", None) == "consume_events"] == []
@@ -0,0 +1,66 @@
+import pytest
+
+from src.vector import cache
+from src.vector.cache import LRUCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Replace the cache's clock with one the test advances by hand."""
+    now = [0.0]
+    monkeypatch.setattr(cache.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_get_missing_returns_default():
+    lru = LRUCache(maxsize=2)
+
+    assert lru.get("a") is None
+    assert lru.get("a", 1) == 1
+
+
+def test_least_recently_used_is_evicted():
+    lru = LRUCache(maxsize=2, ttl=None)
+    lru.set("a", 1)
+    lru.set("b", 2)
+
+    # Reading "a" makes "b" the least recently used entry
+    assert lru.get("a") == 1
+    lru.set("c", 3)
+
+    assert lru.get("b") is None
+    assert lru.get("a") == 1
+    assert lru.get("c") == 3
+    assert len(lru) == 2
+
+
+def test_entries_expire_after_ttl(clock):
+    lru = LRUCache(maxsize=10, ttl=5.0)
+    lru.set("a", 1)
+
+    clock[0] = 5.0
+    assert lru.get("a") == 1
+
+    clock[0] = 5.1
+    assert lru.get("a") is None
+    assert len(lru) == 0
+
+
+def test_set_refreshes_ttl(clock):
+    lru = LRUCache(maxsize=10, ttl=5.0)
+    lru.set("a", 1)
+
+    clock[0] = 4.0
+    lru.set("a", 2)
+    clock[0] = 8.0
+
+    assert lru.get("a") == 2
+
+
+def test_clear():
+    lru = LRUCache()
+    lru.set("a", 1)
+
+    lru.clear()
+
+    assert len(lru) == 0
@@ -0,0 +1,136 @@
+from dataclasses import dataclass
+from pathlib import PurePosixPath
+
+import pytest
+from watchdog import events
+
+from src.watcher._core import (EventType, coalesce, compile_ignore_patterns,
+                               compile_ignore_prefixes, compile_prune_patterns,
+                               get_event_type, is_coalesced)
+
+
+@dataclass
+class TimedEvent:
+    path: str
+    received: float
+
+
+@pytest.mark.parametrize("pattern, path, ignored", [
+    # * stays within one segment, like Path.match
+    ("node_modules/*", "/r/node_modules/a", True),
+    ("node_modules/*", "/r/node_modules/a/b.js", False),
+    ("*.pyc", "/r/pkg/a.pyc", True),
+    ("a/?.txt", "/r/a/b.txt", True),
+    ("a/?.txt", "/r/a/bc.txt", False),
+    ("[!a]?", "/r/cb", True),
+    ("[!a]?", "/r/ab", False),
+    ("[!]x]?", "/r/]a", False),
+    ("[]x]?", "/r/]a", True),
+    # Absolute patterns match the whole path
+    ("/abs/*.js", "/abs/q.js", True),
+    ("/abs/*.js", "/abs/x/q.js", False),
+    ("/abs/*.js", "/r/abs/q.js", False),
+])
+def test_globs_match_like_path_match(pattern, path, ignored):
+    assert bool(compile_ignore_patterns([pattern]).match(path)) is ignored
+    assert PurePosixPath(path).match(pattern) is ignored
+
+
+def test_glob_with_invalid_class_is_taken_literally():
+    # A reversed range is not a valid class; it must not fail the whole compile
+    ignore = compile_ignore_patterns(["[z-a]*.txt", "*.pyc"])
+
+    assert ignore.match("/r/[z-a]*.txt")
+    assert not ignore.match("/r/b.txt")
+    assert ignore.match("/r/a.pyc")
+    assert compile_prune_patterns(["[z-a]*"]).match("/r/[z-a]*")
+
+
+def test_plain_patterns_are_suffixes():
+    ignore = compile_ignore_patterns(["node_modules", ".git"])
+
+    assert ignore.match("/r/node_modules")
+    assert ignore.match("/r/.git")
+    assert not ignore.match("/r/node_modules/a.js")
+
+
+def test_no_patterns_compile_to_none():
+    assert compile_ignore_patterns([]) is None
+
+
+def test_brackets_without_wildcards_are_suffixes():
+    ignore = compile_ignore_patterns(["[abc].txt"])
+
+    assert ignore.match("/r/[abc].txt")
+    assert not ignore.match("/r/a.txt")
+
+
+@pytest.mark.parametrize("pattern", ["[z-a].txt", "[abc.txt", "a].txt", "[].txt", "[!].txt"])
+def test_malformed_brackets_without_wildcards_are_suffixes(pattern):
+    ignore = compile_ignore_patterns([pattern, "*.pyc"])
+
+    assert ignore.match("/r/" + pattern)
+    assert not ignore.match("/r/a.txt")
+    assert ignore.match("/r/a.pyc")
+
+
+def test_directories_are_pruned_by_whole_name():
+    prune = compile_prune_patterns(["build", "env", "*.egg-info"])
+
+    assert prune.match("/r/build")
+    assert prune.match("/r/env")
+    assert prune.match("/r/pkg.egg-info")
+    assert not prune.match("/r/rebuild")
+    assert not prune.match("/r/myenv")
+
+
+def test_prefixes_match_at_the_start_only():
+    ignore = compile_ignore_prefixes(["/r/.git", "/r/build"])
+
+    assert ignore.match("/r/.git/HEAD")
+    assert ignore.match("/r/build")
+    assert not ignore.match("/x/r/build")
+    assert compile_ignore_prefixes([]) is None
+
+
+@pytest.mark.parametrize("event, expected", [
+    (events.FileCreatedEvent("/r/a"), EventType.FILE_CREATED),
+    (events.FileModifiedEvent("/r/a"), EventType.FILE_MODIFIED),
+    (events.FileDeletedEvent("/r/a"), EventType.FILE_DELETED),
+    (events.FileMovedEvent("/r/a", "/r/b"), EventType.FILE_MOVED),
+    (events.FileOpenedEvent("/r/a"), None),
+])
+def test_get_event_type(event, expected):
+    assert get_event_type(event) is expected
+
+
+def test_event_type_str():
+    assert str(EventType.FILE_CREATED) == "File Created"
+    assert str(EventType.FILE_MOVED) == "File Moved"
+
+
+def test_events_inside_the_window_are_coalesced():
+    pending = {}
+
+    assert coalesce(pending, TimedEvent("/r/a", 1.0), window=0.1)
+    assert is_coalesced(pending, "/r/a", 1.05, window=0.1)
+    assert not coalesce(pending, TimedEvent("/r/a", 1.05), window=0.1)
+    assert pending["/r/a"].received == 1.0
+
+
+def test_later_event_replaces_the_pending_one():
+    pending = {}
+    coalesce(pending, TimedEvent("/r/a", 1.0), window=0.1)
+
+    assert coalesce(pending, TimedEvent("/r/a", 1.2), window=0.1)
+    assert pending["/r/a"].received == 1.2
+    # Other paths are not affected
+    assert not is_coalesced(pending, "/r/b", 1.2, window=0.1)
+
+
+def test_zero_window_keeps_the_latest_event():
+    pending = {}
+    coalesce(pending, TimedEvent("/r/a", 1.0), window=0)
+
+    assert coalesce(pending, TimedEvent("/r/a", 1.0), window=0)
+    assert len(pending) == 1
@@ -0,0 +1,121 @@
+import asyncio
+import threading
+
+import pytest
+import pytest_asyncio
+from watchdog import events
+
+from src.watcher import inotify
+from src.watcher.inotify import INOTIFY_AVAILABLE, InotifyObserver
+
+pytestmark = pytest.mark.skipif(not INOTIFY_AVAILABLE, reason="inotify is not available")
+
+
+@pytest_asyncio.fixture
+async def observed(tmp_path, monkeypatch):
+    """A running observer on tmp_path/root and the events it reports."""
+    monkeypatch.setattr(inotify, "MOVE_PAIR_TIMEOUT", 0.05)
+    root = tmp_path / "root"
+    root.mkdir()
+    received = []
+    observer = InotifyObserver(str(root), received.append, lambda path: False)
+    await observer.start()
+    yield root, received
+    await observer.stop()
+
+
+@pytest.mark.asyncio
+async def test_rename_is_reported_as_a_move(observed):
+    root, received = observed
+    (root / "a.txt").write_text("x")
+    await asyncio.sleep(0.1)
+    received.clear()
+
+    (root / "a.txt").rename(root / "b.txt")
+    await asyncio.sleep(0.1)
+
+    assert received == [events.FileMovedEvent(str(root / "a.txt"), str(root / "b.txt"))]
+
+
+@pytest.mark.asyncio
+async def test_move_out_of_the_tree_is_reported_as_a_deletion(observed, tmp_path):
+    root, received = observed
+    (root / "a.txt").write_text("x")
+    await asyncio.sleep(0.1)
+    received.clear()
+
+    (root / "a.txt").rename(tmp_path / "a.txt")
+    await asyncio.sleep(0.02)
+    # Nothing is reported while the MOVED_TO half may still arrive
+    assert received == []
+
+    await asyncio.sleep(0.1)
+    assert received == [events.FileDeletedEvent(str(root / "a.txt"))]
+
+
+@pytest.mark.asyncio
+async def test_renamed_directory_keeps_its_watches(observed):
+    root, received = observed
+    (root / "old").mkdir()
+    await asyncio.sleep(0.1)
+
+    (root / "old").rename(root / "new")
+    await asyncio.sleep(0.1)
+    received.clear()
+    (root / "new" / "a.txt").write_text("x")
+    await asyncio.sleep(0.1)
+
+    assert events.FileCreatedEvent(str(root / "new" / "a.txt")) in received
+
+
+@pytest.mark.asyncio
+async def test_moved_in_tree_is_walked_off_the_loop(tmp_path, monkeypatch):
+    root = tmp_path / "root"
+    root.mkdir()
+    outside = tmp_path / "outside"
+    (outside / "sub").mkdir(parents=True)
+    (outside / "sub" / "a.py").write_text("x")
+    walked_on = set()
+
+    def should_ignore(path):
+        if path.endswith("sub"):
+            walked_on.add(threading.current_thread())
+        return False
+
+    received = []
+    observer = InotifyObserver(str(root), received.append, should_ignore)
+    await observer.start()
+    walked_on.clear()
+    try:
+        outside.rename(root / "moved")
+        await asyncio.sleep(0.1)
+        (root / "moved" / "sub" / "b.py").write_text("x")
+        await asyncio.sleep(0.1)
+    finally:
+        await observer.stop()
+
+    assert walked_on and threading.main_thread() not in walked_on
+    assert events.FileCreatedEvent(str(root / "moved" / "sub" / "a.py")) in received
+    assert events.FileCreatedEvent(str(root / "moved" / "sub" / "b.py")) in received
+
+
+@pytest.mark.asyncio
+async def test_root_is_watched_even_if_its_name_is_pruned(tmp_path):
+    root = tmp_path / "build"
+    (root / "build").mkdir(parents=True)
+    received = []
+    observer = InotifyObserver(str(root), received.append,
+                               lambda path: path.endswith("/build"))
+    await observer.start()
+    try:
+        (root / "a.py").write_text("x")
+        (root / "build" / "b.py").write_text("x")
+        (root / "new").mkdir()
+        await asyncio.sleep(0.1)
+        (root / "new" / "c.py").write_text("x")
+        await asyncio.sleep(0.1)
+    finally:
+        await observer.stop()
+
+    created = {e.src_path for e in received if isinstance(e, events.FileCreatedEvent)}
+    assert created == {str(root / "a.py"), str(root / "new" / "c.py")}
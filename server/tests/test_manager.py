@@ -0,0 +1,198 @@
+import asyncio
+import numpy as np
+import pytest
+
+from src.vector.manager import EmbeddingManager, InMemoryEmbeddingManager
+from src.vector.vector import SearchResult
+
+
+class FakeEmbeddingProvider:
+    """Embeds each text as a fixed vector so results are predictable."""
+
+    def __init__(self, vectors: dict[str, list[float]]):
+        self.vectors = vectors
+
+    async def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return [self.vectors[text] for text in texts]
+
+    async def embed_query(self, query: str) -> list[float]:
+        return self.vectors[query]
+
+
+@pytest.fixture
+def provider():
+    return FakeEmbeddingProvider({
+        "x": [1.0, 0.0, 0.0],
+        "y": [0.0, 1.0, 0.0],
+        "xy": [1.0, 1.0, 0.0],
+    })
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("dtype", [np.float32, np.float16])
+async def test_similarity_search_ranks_by_cosine(provider, dtype):
+    """Both storage types rank by cosine similarity and return float32 scores."""
+    manager = InMemoryEmbeddingManager(provider, dtype=dtype)
+    await manager.add_texts(["x", "y", "xy"])
+
+    results = await manager.similarity_search("x", limit=2)
+
+    assert [r.text for r in results] == ["x", "xy"]
+    assert results[0].score == pytest.approx(1.0, abs=1e-3)
+    assert results[1].score == pytest.approx(2 ** -0.5, abs=1e-3)
+
+
+def test_float16_scores_match_float32_across_blocks(provider):
+    """Blockwise upcasting gives the same scores as a float32 product."""
+    rng = np.random.default_rng(0)
+    matrix = rng.standard_normal((2500, 8)).astype(np.float16)
+    q = rng.standard_normal(8).astype(np.float32)
+
+    manager = InMemoryEmbeddingManager(provider, dtype=np.float16)
+    manager.SCORE_BLOCK_ROWS = 1000
+    manager.vectors = matrix
+
+    scores = manager._score(q)
+
+    assert scores.dtype == np.float32
+    np.testing.assert_allclose(scores, matrix.astype(np.float32) @ q, rtol=1e-5, atol=1e-5)
+
+
+class FakeVectorStore:
+    """Records the searches it receives and returns one result per query."""
+
+    def __init__(self):
+        self.queries: list[list[float]] = []
+        self.batches: list[int] = []
+
+    async def query(self, query_vector, k=10, filter=None):
+        self.queries.append(query_vector)
+        return [SearchResult("text", {}, 0.0, str(query_vector), "source")]
+
+    async def query_batch(self, query_vectors, k=10, filter=None):
+        self.batches.append(len(query_vectors))
+        return [await self.query(v, k, filter) for v in query_vectors]
+
+    async def add_vectors(self, vectors):
+        pass
+
+    async def delete(self, ids):
+        pass
+
+
+class CountingProvider(FakeEmbeddingProvider):
+    def __init__(self, vectors):
+        super().__init__(vectors)
+        self.query_calls = 0
+
+    async def embed_query(self, query):
+        self.query_calls += 1
+        return await super().embed_query(query)
+
+
+@pytest.mark.asyncio
+async def test_repeated_search_is_served_from_cache():
+    provider = CountingProvider({"x": [1.0, 0.0]})
+    store = FakeVectorStore()
+    manager = EmbeddingManager(provider, store, coalesce_window=0)
+
+    first = await manager.similarity_search("x")
+    second = await manager.similarity_search("x")
+
+    assert provider.query_calls == 1
+    assert len(store.queries) == 1
+    assert first == second
+    # Cached results are copied, so callers cannot change the cached objects
+    assert first[0] is not second[0]
+
+
+@pytest.mark.asyncio
+async def test_store_change_invalidates_cached_results():
+    provider = CountingProvider({"x": [1.0, 0.0], "doc": [0.0, 1.0]})
+    store = FakeVectorStore()
+    manager = EmbeddingManager(provider, store, coalesce_window=0)
+
+    await manager.similarity_search("x")
+    await manager.add_texts(["doc"])
+    await manager.similarity_search("x")
+
+    # The query embedding is reused, the search itself is not
+    assert provider.query_calls == 1
+    assert len(store.queries) == 2
+
+
+@pytest.mark.asyncio
+async def test_concurrent_searches_are_coalesced_into_one_batch():
+    provider = FakeEmbeddingProvider({"a": [1.0, 0.0], "b": [0.0, 1.0], "c": [1.0, 1.0]})
+    store = FakeVectorStore()
+    manager = EmbeddingManager(provider, store, coalesce_window=0.01)
+
+    results = await asyncio.gather(*(manager.similarity_search(q) for q in "abc"))
+
+    assert store.batches == [3]
+    # Every caller gets the results of its own query
+    assert [r[0].vector_id for r in results] == [str(provider.vectors[q]) for q in "abc"]
+
+
+@pytest.mark.asyncio
+async def test_filtered_search_is_not_coalesced():
+    provider = FakeEmbeddingProvider({"a": [1.0, 0.0]})
+    store = FakeVectorStore()
+    manager = EmbeddingManager(provider, store, coalesce_window=0.01)
+
+    await manager.similarity_search("a", filter={"source": "x"})
+
+    assert store.batches == []
+    assert len(store.queries) == 1
+
+
+@pytest.mark.asyncio
+async def test_batch_failure_reaches_every_caller():
+    class FailingStore(FakeVectorStore):
+        async def query_batch(self, query_vectors, k=10, filter=None):
+            raise RuntimeError("store down")
+
+    provider = FakeEmbeddingProvider({"a": [1.0, 0.0], "b": [0.0, 1.0]})
+    manager = EmbeddingManager(provider, FailingStore(), coalesce_window=0.01)
+
+    results = await asyncio.gather(
+        manager.similarity_search("a"), manager.similarity_search("b"),
+        return_exceptions=True)
+
+    assert all(isinstance(r, RuntimeError) for r in results)
+
+
+@pytest.mark.asyncio
+async def test_flush_without_a_vector_store(provider):
+    manager = InMemoryEmbeddingManager(provider)
+
+    await manager.flush()
+
+
+@pytest.mark.asyncio
+async def test_flush_reaches_the_vector_store(provider):
+    class FlushingStore(FakeVectorStore):
+        flushed = 0
+
+        async def flush(self):
+            self.flushed += 1
+
+    store = FlushingStore()
+    manager = InMemoryEmbeddingManager(provider, vector_store=store)
+
+    await manager.flush()
+
+    assert store.flushed == 1
+
+
+@pytest.mark.asyncio
+async def test_keyword_search_uses_the_vector_store():
+    class KeywordStore(FakeVectorStore):
+        async def keyword_search(self, query, limit=10):
+            return [SearchResult(query, {}, 1.0, "k", "source")][:limit]
+
+    manager = EmbeddingManager(FakeEmbeddingProvider({}), KeywordStore())
+
+    results = await manager.keyword_search("parse config", limit=1)
+
+    assert [r.text for r in results] == ["parse config"]
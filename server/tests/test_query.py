@@ -0,0 +1,306 @@
+import asyncio
+import gc
+
+import pytest
+import tiktoken
+
+from src.query.query import QueryProcessor
+from src.query.stream import StreamQueryProcessor
+from src.query.usage import UsageCallbackHandler
+from prompt import PromptProviderType, PromptType
+from src.vector.vector import SearchResult
+
+
+class FakeLLM:
+    def __init__(self, model_name=None):
+        self.model_name = model_name
+
+
+@pytest.fixture
+def loads(monkeypatch):
+    """Record tiktoken loads, failing them like an offline first use would."""
+    calls = []
+
+    def get_encoding(name):
+        calls.append(name)
+        raise ConnectionError("offline")
+
+    monkeypatch.setattr(tiktoken, "get_encoding", get_encoding)
+    return calls
+
+
+def test_constructor_does_not_load_the_tokenizer(loads):
+    QueryProcessor(None, FakeLLM("gpt-4o"))
+
+    assert loads == []
+
+
+def test_offline_tokenizer_falls_back_to_estimate(loads):
+    processor = QueryProcessor(None, FakeLLM("gpt-4o"))
+
+    assert processor._count_tokens("a" * 10) == 3
+    assert loads == ["o200k_base"]
+
+    # The failed load is not retried for every text
+    processor._count_tokens("b" * 8)
+    assert loads == ["o200k_base"]
+
+
+@pytest.mark.parametrize("model_name", [None, "claude-3-5-sonnet"])
+def test_non_openai_models_are_estimated(loads, model_name):
+    processor = QueryProcessor(None, FakeLLM(model_name))
+
+    assert processor._count_tokens("a" * 8) == 2
+    assert loads == []
+
+
+class FakeChunk:
+    def __init__(self, content, usage_metadata=None):
+        self.content = content
+        self.usage_metadata = usage_metadata
+
+
+class StreamingLLM:
+    model_name = None
+
+    def __init__(self):
+        self.prompts = []
+
+    async def astream(self, prompt):
+        self.prompts.append(prompt)
+        yield FakeChunk("analysis")
+
+
+class FakeManager:
+    def __init__(self, keyword_results, search_fails=False, search_delay=0.0):
+        self.keyword_results = keyword_results
+        self.search_fails = search_fails
+        self.search_delay = search_delay
+
+    async def keyword_search(self, query, limit=10):
+        return self.keyword_results[:limit]
+
+    async def similarity_search(self, query, limit=10, filter=None):
+        await asyncio.sleep(self.search_delay)
+        if self.search_fails:
+            raise RuntimeError("search failed")
+        return []
+
+
+@pytest.mark.asyncio
+async def test_keyword_results_use_their_own_threshold():
+    manager = FakeManager([
+        SearchResult("def parse(): pass", {}, 0.6, "k1", "a.py"),
+        SearchResult("def load(): pass", {}, 0.4, "k2", "b.py"),
+    ])
+    llm = StreamingLLM()
+    processor = StreamQueryProcessor(manager, llm, min_relevance_score=0.9,
+                                     min_keyword_score=0.5)
+
+    out = [r.text async for r in processor.stream_analysis("parse load")]
+
+    assert out == ["analysis"]
+    assert "a.py" in llm.prompts[0] and "b.py" not in llm.prompts[0]
+
+
+@pytest.mark.asyncio
+async def test_failed_search_is_retrieved_when_stream_is_closed_early():
+    loop = asyncio.get_running_loop()
+    errors = []
+    loop.set_exception_handler(lambda _, context: errors.append(context))
+
+    manager = FakeManager([SearchResult("def parse(): pass", {}, 1.0, "k1", "a.py")],
+                          search_fails=True)
+    stream = StreamQueryProcessor(manager, StreamingLLM()).stream_analysis("parse")
+
+    assert (await anext(stream)).text == "analysis"
+    await stream.aclose()
+    gc.collect()
+
+    assert errors == []
+
+
+@pytest.mark.asyncio
+async def test_closing_the_stream_finishes_the_search_task():
+    manager = FakeManager([SearchResult("def parse(): pass", {}, 1.0, "k1", "a.py")],
+                          search_delay=10)
+    stream = StreamQueryProcessor(manager, StreamingLLM()).stream_analysis("parse")
+
+    assert (await anext(stream)).text == "analysis"
+    await stream.aclose()
+
+    searches = [task for task in asyncio.all_tasks()
+                if getattr(task.get_coro(), "__name__", None) == "_get_similar_results"]
+    assert searches == []
+
+
+class ChunkedLLM:
+    """Streams each prompt back as a few chunks, recording the prompts."""
+    model_name = None
+
+    def __init__(self, chunks=("a", "b", "c")):
+        self.chunks = chunks
+        self.prompts = []
+
+    async def astream(self, prompt):
+        self.prompts.append(prompt)
+        for chunk in self.chunks:
+            yield FakeChunk(chunk)
+
+
+def make_results(count):
+    return [SearchResult(f"def f{i}(): pass", {}, 1.0, f"k{i}", f"f{i}.py") for i in range(count)]
+
+
+def producer_tasks():
+    return [task for task in asyncio.all_tasks()
+            if getattr(task.get_coro(), "__name__", None) == "_produce_prompts"]
+
+
+@pytest.mark.asyncio
+async def test_batches_are_streamed_in_order():
+    llm = ChunkedLLM(chunks=("x",))
+    # A token budget of 1 puts every result in a batch of its own
+    processor = StreamQueryProcessor(FakeManager(make_results(4)), llm,
+                                     max_batch_tokens=1, keyword_results=4)
+
+    out = [r.text async for r in processor.stream_analysis("f")]
+
+    assert out == ["x"] * 4
+    assert [next(f"f{i}.py" for i in range(4) if f"f{i}.py" in p) for p in llm.prompts] == \
+        ["f0.py", "f1.py", "f2.py", "f3.py"]
+
+
+@pytest.mark.asyncio
+async def test_closing_the_stream_finishes_the_prompt_producer():
+    processor = StreamQueryProcessor(FakeManager([]), ChunkedLLM(),
+                                     max_batch_tokens=1, flush_chars=1)
+    stream = processor._stream_batches("f", make_results(6), PromptType.AGGREGATE,
+                                       PromptProviderType.SEMANTIC, UsageCallbackHandler())
+
+    assert (await anext(stream)).text == "a"
+    # The producer is blocked on the full prompt queue
+    assert producer_tasks()
+    await stream.aclose()
+
+    assert producer_tasks() == []
+
+
+@pytest.mark.asyncio
+async def test_prompt_failure_reaches_the_consumer():
+    processor = StreamQueryProcessor(FakeManager([]), ChunkedLLM())
+
+    def fail(*args):
+        raise ValueError("bad prompt")
+
+    processor.create_prompt = fail
+    with pytest.raises(ValueError, match="bad prompt"):
+        async for _ in processor._stream_batches("f", make_results(2), None, None,
+                                                 UsageCallbackHandler()):
+            pass
+
+    assert producer_tasks() == []
+
+
+async def chunk_stream(*chunks, delay=0.0):
+    """Yield FakeChunks, sleeping ``delay`` seconds before each one after the first."""
+    for i, chunk in enumerate(chunks):
+        if i and delay:
+            await asyncio.sleep(delay)
+        yield chunk if isinstance(chunk, FakeChunk) else FakeChunk(chunk)
+
+
+async def buffered(processor, stream, usage=None):
+    return [text async for text in processor._buffer_stream(stream, usage or UsageCallbackHandler())]
+
+
+@pytest.mark.asyncio
+async def test_buffer_flushes_once_flush_chars_are_reached():
+    processor = StreamQueryProcessor(None, StreamingLLM(), flush_chars=5, flush_interval_s=60)
+
+    out = await buffered(processor, chunk_stream("ab", "cde", "fg", "h"))
+
+    # The tail is flushed when the stream ends
+    assert out == ["abcde", "fgh"]
+
+
+@pytest.mark.asyncio
+async def test_buffer_flushes_once_the_interval_has_passed():
+    processor = StreamQueryProcessor(None, StreamingLLM(), flush_chars=1000, flush_interval_s=0.03)
+
+    out = await buffered(processor, chunk_stream("a", "b", delay=0.06))
+
+    assert out == ["ab"]
+
+    out = await buffered(processor, chunk_stream("a", "b", "c", delay=0.06))
+    assert out == ["ab", "c"]
+
+
+@pytest.mark.asyncio
+async def test_buffer_records_usage_of_every_chunk():
+    processor = StreamQueryProcessor(None, StreamingLLM(), flush_chars=1000, flush_interval_s=60)
+    usage = UsageCallbackHandler()
+
+    out = await buffered(processor, chunk_stream(
+        FakeChunk("a", {"total_tokens": 2}), FakeChunk("", {"total_tokens": 3}), "b"), usage)
+
+    assert out == ["ab"]
+    assert usage.total_tokens == 5
+
+
+@pytest.mark.asyncio
+async def test_empty_stream_yields_nothing():
+    processor = StreamQueryProcessor(None, StreamingLLM())
+
+    assert await buffered(processor, chunk_stream()) == []
+
+
+def batch_processor(max_batch_tokens):
+    return QueryProcessor(None, FakeLLM(None), max_batch_tokens=max_batch_tokens)
+
+
+def test_batch_includes_results_that_fit_exactly():
+    results = make_results(4)
+    # Cumulative token counts of the results: 4, 4, 12, 4
+    offsets = [4, 8, 20, 24]
+
+    batch = batch_processor(8)._create_batch(0, results, offsets)
+
+    assert batch.files == ["f0.py", "f1.py"]
+    assert batch.total_tokens == 8
+    assert batch.metadata == {"start_index": 0, "end_index": 2, "total_results": 4}
+
+
+def test_result_over_budget_forms_its_own_batch():
+    batch = batch_processor(8)._create_batch(2, make_results(4), [4, 8, 20, 24])
+
+    assert batch.files == ["f2.py"]
+    assert batch.total_tokens == 12
+    assert batch.metadata["end_index"] == 3
+
+
+def test_batch_from_a_later_start_counts_only_its_own_tokens():
+    processor = batch_processor(10)
+    results = make_results(5)
+    offsets = [3, 6, 9, 12, 15]
+
+    batch = processor._create_batch(1, results, offsets)
+
+    assert batch.files == ["f1.py", "f2.py", "f3.py"]
+    assert batch.total_tokens == 9
+    assert processor._create_batch(4, results, offsets).files == ["f4.py"]
+    assert processor._create_batch(5, results, offsets) is None
+
+
+def test_batches_cover_every_result_once():
+    processor = batch_processor(30)
+    results = make_results(7)
+    offsets = processor._batch_offsets(results)
+
+    files, start = [], 0
+    while (batch := processor._create_batch(start, results, offsets)) is not None:
+        assert batch.total_tokens <= 30 or len(batch.files) == 1
+        files += batch.files
+        start = batch.metadata["end_index"]
+
+    assert files == [f"f{i}.py" for i in range(7)]
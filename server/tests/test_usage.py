@@ -0,0 +1,53 @@
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, LLMResult
+
+from src.query.usage import UsageCallbackHandler
+
+
+def test_token_usage_report_is_preferred():
+    """The provider's token_usage total is used when present."""
+    handler = UsageCallbackHandler()
+    message = AIMessage(content="hi", usage_metadata={
+        "input_tokens": 1, "output_tokens": 1, "total_tokens": 2})
+    response = LLMResult(
+        generations=[[ChatGeneration(message=message)]],
+        llm_output={"token_usage": {"total_tokens": 40}},
+    )
+
+    handler.on_llm_end(response)
+
+    assert handler.total_tokens == 40
+
+
+def test_usage_metadata_is_the_fallback():
+    """Without a token_usage report, every message's usage_metadata is summed."""
+    handler = UsageCallbackHandler()
+    generations = [
+        [ChatGeneration(message=AIMessage(content="a", usage_metadata={
+            "input_tokens": 3, "output_tokens": 4, "total_tokens": 7}))],
+        [ChatGeneration(message=AIMessage(content="b", usage_metadata={
+            "input_tokens": 1, "output_tokens": 2, "total_tokens": 3}))],
+    ]
+
+    handler.on_llm_end(LLMResult(generations=generations))
+
+    assert handler.total_tokens == 10
+
+
+def test_add_usage_accumulates_stream_chunks():
+    handler = UsageCallbackHandler()
+
+    handler.add_usage(None)
+    handler.add_usage({"total_tokens": 5})
+    handler.add_usage({"total_tokens": 6})
+
+    assert handler.total_tokens == 11
+
+
+def test_exceeds_budget():
+    handler = UsageCallbackHandler()
+    handler.add_usage({"total_tokens": 100})
+
+    assert not handler.exceeds(None)
+    assert not handler.exceeds(100)
+    assert handler.exceeds(99)
@@ -0,0 +1,258 @@
+import asyncio
+import json
+import threading
+import time
+
+import faiss
+import numpy as np
+import pytest
+
+from src.vector.vector import EmbeddingVector, FAISSVectorStore, _ReadWriteLock
+
+
+def make_store(path, **kwargs) -> FAISSVectorStore:
+    return FAISSVectorStore(4, path, embedding_model=object(), **kwargs)
+
+
+def make_vectors(prefix: str, rows) -> list[EmbeddingVector]:
+    return [
+        EmbeddingVector(id=f"{prefix}{i}", vector=list(map(float, row)),
+                        metadata={"source": f"{prefix}{i}.py"}, text=f"{prefix}{i}")
+        for i, row in enumerate(rows)
+    ]
+
+
+@pytest.mark.asyncio
+async def test_readers_share_the_lock():
+    lock = _ReadWriteLock()
+    inside = 0
+    most_inside = 0
+
+    async def reader():
+        nonlocal inside, most_inside
+        async with lock.read():
+            inside += 1
+            most_inside = max(most_inside, inside)
+            await asyncio.sleep(0.01)
+            inside -= 1
+
+    await asyncio.gather(*(reader() for _ in range(3)))
+
+    assert most_inside == 3
+
+
+@pytest.mark.asyncio
+async def test_writer_excludes_readers_and_goes_first():
+    lock = _ReadWriteLock()
+    order = []
+
+    async def reader(name, delay):
+        await asyncio.sleep(delay)
+        async with lock.read():
+            order.append(f"{name} in")
+            await asyncio.sleep(0.02)
+            order.append(f"{name} out")
+
+    async def writer():
+        await asyncio.sleep(0.005)
+        async with lock.write():
+            order.append("writer in")
+            await asyncio.sleep(0.01)
+            order.append("writer out")
+
+    # The second reader arrives while the writer waits, so it goes after it
+    await asyncio.gather(reader("r1", 0), writer(), reader("r2", 0.01))
+
+    assert order == ["r1 in", "r1 out", "writer in", "writer out", "r2 in", "r2 out"]
+
+
+@pytest.mark.asyncio
+async def test_queries_run_concurrently(tmp_path):
+    store = make_store(tmp_path / "index.faiss")
+    await store.add_vectors(make_vectors("a", np.eye(4)))
+
+    search = store.index.search
+    running = 0
+    most_running = 0
+    guard = threading.Lock()
+
+    def slow_search(*args, **kwargs):
+        nonlocal running, most_running
+        with guard:
+            running += 1
+            most_running = max(most_running, running)
+        time.sleep(0.05)
+        with guard:
+            running -= 1
+        return search(*args, **kwargs)
+
+    store.index.search = slow_search
+    results = await asyncio.gather(*(store.query([1, 0, 0, 0], k=1) for _ in range(3)))
+
+    assert most_running > 1
+    assert all(r[0].vector_id == "a0" for r in results)
+
+
+@pytest.mark.asyncio
+async def test_store_survives_a_reload(tmp_path):
+    path = tmp_path / "index.faiss"
+    store = make_store(path)
+    await store.add_vectors(make_vectors("a", np.eye(4)))
+    await store.flush()
+
+    reloaded = make_store(path)
+    results = await reloaded.query([1, 0, 0, 0], k=2)
+
+    assert [r.vector_id for r in results] == ["a0", "a1"]
+    assert results[0].text == "a0"
+    assert results[0].source_file == "a0.py"
+
+
+@pytest.mark.asyncio
+async def test_reloaded_store_can_be_added_to_and_deleted_from(tmp_path):
+    path = tmp_path / "index.faiss"
+    store = make_store(path)
+    await store.add_vectors(make_vectors("a", np.eye(4)))
+    await store.flush()
+
+    reloaded = make_store(path)
+    await reloaded.add_vectors(make_vectors("n", [[0, 0, 0, 2]]))
+
+    assert reloaded.index.ntotal == len(reloaded.vectors) == 5
+    assert (await reloaded.query([1, 0, 0, 0], k=1))[0].vector_id == "a0"
+    assert (await reloaded.query([0, 0, 0, 2], k=1))[0].vector_id == "n0"
+
+    await reloaded.delete(["a1"])
+
+    assert reloaded.index.ntotal == len(reloaded.vectors) == 4
+    assert (await reloaded.query([1, 0, 0, 0], k=1))[0].vector_id == "a0"
+
+
+@pytest.mark.asyncio
+async def test_index_without_metadata_is_not_loaded(tmp_path):
+    path = tmp_path / "index.faiss"
+    store = make_store(path)
+    await store.add_vectors(make_vectors("a", np.eye(4)))
+    await store.flush()
+    (tmp_path / "index.faiss.meta.json").unlink()
+
+    reloaded = make_store(path)
+
+    assert await reloaded.query([1, 0, 0, 0], k=1) == []
+    assert reloaded.index.ntotal == 0
+
+
+@pytest.mark.asyncio
+async def test_index_with_mismatched_metadata_is_not_loaded(tmp_path):
+    path = tmp_path / "index.faiss"
+    store = make_store(path)
+    await store.add_vectors(make_vectors("a", np.eye(4)))
+    await store.flush()
+    meta = (tmp_path / "index.faiss.meta.json").read_text()
+
+    # Metadata of an older save next to a newer index
+    await store.add_vectors(make_vectors("n", [[1, 1, 0, 0]]))
+    await store.flush()
+    (tmp_path / "index.faiss.meta.json").write_text(meta)
+
+    reloaded = make_store(path)
+
+    assert (await reloaded.get_stats())["num_vectors"] == 0
+    assert reloaded.index.ntotal == 0
+
+
+@pytest.mark.asyncio
+async def test_query_batch_returns_results_per_query(tmp_path):
+    store = make_store(tmp_path / "index.faiss")
+    await store.add_vectors(make_vectors("a", np.eye(4)))
+
+    results = await store.query_batch([[0, 1, 0, 0], [0, 0, 0, 1]], k=1)
+
+    assert [[r.vector_id for r in rs] for rs in results] == [["a1"], ["a3"]]
+
+
+@pytest.mark.asyncio
+async def test_quantized_store_searches_flat_index_until_trained(tmp_path):
+    store = make_store(tmp_path / "index.faiss", quantization="int8", train_size=100)
+    await store.add_vectors(make_vectors("x", [[0.1, 0.1, 0.1, 0.1]]))
+    await store.add_vectors(make_vectors("y", [[5, 0, 0, 0]]))
+
+    results = await store.query([5, 0, 0, 0], k=2)
+
+    assert not isinstance(store.index, faiss.IndexHNSW)
+    assert [r.vector_id for r in results] == ["y0", "x0"]
+    assert results[0].score == pytest.approx(0.0)
+
+
+@pytest.mark.asyncio
+async def test_quantized_store_trains_once_enough_vectors_are_added(tmp_path):
+    rng = np.random.default_rng(0)
+    rows = rng.uniform(-1, 1, (64, 4))
+    store = make_store(tmp_path / "index.faiss", quantization="int8", train_size=50)
+
+    await store.add_vectors(make_vectors("a", rows[:40]))
+    assert not isinstance(store.index, faiss.IndexHNSW)
+
+    await store.add_vectors(make_vectors("b", rows[40:]))
+    assert isinstance(store.index, faiss.IndexHNSWSQ)
+    assert store.index.ntotal == 64
+
+    results = await store.query(list(rows[45]), k=1)
+    assert results[0].vector_id == "b5"
+
+
+@pytest.mark.asyncio
+async def test_flush_trains_the_quantizer_on_all_vectors(tmp_path):
+    store = make_store(tmp_path / "index.faiss", quantization="float16")
+    await store.add_vectors(make_vectors("a", np.eye(4)))
+
+    await store.flush()
+
+    assert isinstance(store.index, faiss.IndexHNSWSQ)
+    assert store.index.ntotal == 4
+    assert (await store.query([0, 0, 1, 0], k=1))[0].vector_id == "a2"
+
+
+@pytest.mark.asyncio
+async def test_keyword_search_ranks_stored_texts(tmp_path):
+    store = make_store(tmp_path / "index.faiss")
+    vectors = make_vectors("a", np.eye(4)[:3])
+    vectors[0].text = "def parse_config(path): pass"
+    vectors[1].text = "def load_config(path): return parse(path)"
+    vectors[2].text = "class Watcher: pass"
+    await store.add_vectors(vectors)
+    await store.flush()
+
+    results = await make_store(tmp_path / "index.faiss").keyword_search("parse config", limit=5)
+
+    assert [(r.vector_id, r.score) for r in results] == [("a1", 1.0), ("a0", 1.0)]
+    assert results[0].source_file == "a1.py"
+
+
+def test_quantization_cannot_be_combined_with_the_gpu(tmp_path):
+    with pytest.raises(ValueError, match="use_gpu"):
+        make_store(tmp_path / "index.faiss", use_gpu=True, quantization="int8")
+
+
+@pytest.mark.asyncio
+async def test_failed_save_stays_pending_and_leaves_no_temp_files(tmp_path, monkeypatch):
+    path = tmp_path / "index.faiss"
+    store = make_store(path)
+    await store.add_vectors(make_vectors("a", np.eye(4)))
+
+    def fail(*args, **kwargs):
+        raise TypeError("not serializable")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(json, "dump", fail)
+        await store.flush()
+
+    assert store._save_pending
+    assert not list(tmp_path.glob("*.tmp"))
+    assert not (tmp_path / "index.faiss.meta.json").exists()
+
+    # The next flush retries the save
+    await store.flush()
+
+    assert not store._save_pending
+    assert [r.vector_id for r in await make_store(path).query([1, 0, 0, 0], k=1)] == ["a0"]
@@ -1,7 +1,10 @@
 from src.watcher import start_watching, FileWatcher, EventType, FileEvent
+import logging
 import queue
+import threading
 import time
 import pytest
+from watchdog import events
 
 import sys
 import os
@@ -118,3 +121,66 @@ def test_event_coalescing(watcher, temp_dir):
             events.append(watcher.event_queue.get(timeout=0.1))
     except queue.Empty:
         pass
+
+
+def test_flusher_wakes_for_new_events(watcher, temp_dir):
+    """Test that an event reaches the queue without any other activity."""
+    path = str(Path(temp_dir) / "a.txt")
+    watcher._handle_event(events.FileCreatedEvent(path))
+
+    event = watcher.event_queue.get(timeout=1)
+
+    assert event.type == EventType.FILE_CREATED
+    assert event.path == path
+
+
+def test_pending_events_are_flushed_on_close(temp_dir):
+    """Test that closing the watcher does not lose the events waiting to be flushed."""
+    watcher = FileWatcher(temp_dir)
+    path = str(Path(temp_dir) / "a.txt")
+    watcher._handle_event(events.FileCreatedEvent(path))
+    watcher.close()
+
+    assert watcher.event_queue.get_nowait().path == path
+
+
+def test_full_queue_waits_for_the_consumer(watcher, temp_dir):
+    """Test that a full queue delays events instead of dropping them."""
+    watcher.event_queue = queue.Queue(maxsize=1)
+    paths = [str(Path(temp_dir) / f"{i}.txt") for i in range(3)]
+    for path in paths:
+        watcher._handle_event(events.FileCreatedEvent(path))
+
+    time.sleep(0.3)
+    received = [watcher.event_queue.get(timeout=1).path for _ in paths]
+
+    assert received == paths
+
+
+def test_full_queue_on_close_logs_dropped_events(temp_dir, caplog):
+    """Test that closing with a full queue and no consumer returns and reports the loss."""
+    watcher = FileWatcher(temp_dir)
+    watcher.event_queue = queue.Queue(maxsize=1)
+    for i in range(3):
+        watcher._handle_event(events.FileCreatedEvent(str(Path(temp_dir) / f"{i}.txt")))
+
+    with caplog.at_level(logging.WARNING):
+        closer = threading.Thread(target=watcher.close)
+        closer.start()
+        closer.join(timeout=2)
+
+    assert not closer.is_alive()
+    assert "dropping 2 events" in caplog.text
+
+
+def test_moves_carry_the_destination(watcher, temp_dir):
+    """Test that a move event says where the file went."""
+    src = str(Path(temp_dir) / "a.txt")
+    dest = str(Path(temp_dir) / "b.txt")
+    watcher._handle_event(events.FileMovedEvent(src, dest))
+
+    event = watcher.event_queue.get(timeout=1)
+
+    assert event.type == EventType.FILE_MOVED
+    assert event.path == src
+    assert event.dest_path == dest